@@ -0,0 +1,43 @@
+"""
+Process-local cache of the users to auto-deploy for a push.
+
+Every push webhook needs the auto-deploy configs for its repository and
+branch. They are looked up with deployment_crud's indexed
+get_auto_deploy_configs_for_push and the owning user IDs are cached per
+(repository, branch). Entries expire after CONFIG_INDEX_TTL seconds and
+deployment_crud clears the cache whenever a config is created, updated or
+deleted.
+"""
+from threading import Lock
+from typing import List
+
+from cachetools import TTLCache
+from sqlalchemy.orm import Session
+
+CONFIG_INDEX_SIZE = 4096
+# Upper bound on staleness if a config is changed by another process
+CONFIG_INDEX_TTL = 60  # seconds
+
+_user_ids: TTLCache = TTLCache(maxsize=CONFIG_INDEX_SIZE, ttl=CONFIG_INDEX_TTL)
+# TTLCache is not thread safe and sync routes run in a threadpool
+_lock = Lock()
+
+
+def get_auto_deploy_user_ids(db: Session, repo_full_name: str, branch: str) -> List[str]:
+    """Return the IDs of users with an auto-deploy config for this repository and branch"""
+    key = (repo_full_name, branch)
+    with _lock:
+        user_ids = _user_ids.get(key)
+    if user_ids is None:
+        # Imported here: deployment_crud imports this module to invalidate it
+        from app.database.deployment_crud import get_auto_deploy_configs_for_push
+        user_ids = [config.user_id for config in get_auto_deploy_configs_for_push(db, repo_full_name, branch)]
+        with _lock:
+            _user_ids[key] = user_ids
+    return user_ids
+
+
+def invalidate():
+    """Drop every cached entry so the next lookups query the database"""
+    with _lock:
+        _user_ids.clear()
@@ -1,12 +1,14 @@
-from sqlalchemy import Column, String, DateTime, JSON, ForeignKey, create_engine, Integer, Boolean, Text, Enum, Float
+from sqlalchemy import Column, String, DateTime, JSON, ForeignKey, create_engine, event, func, literal_column, Index, Integer, Boolean, Text, Enum, Float
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
-import uuid
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, relationship, sessionmaker
+from sqlalchemy.pool import QueuePool
+import os
 import logging
 from datetime import datetime, timezone
 import logging
 from enum import Enum as PyEnum
-import json
+import orjson
 from app.settings import settings
 import asyncio
 from app.websockets.logs import log_manager
@@ -16,8 +18,66 @@ logger = logging.getLogger(__name__)
 # SQLAlchemy setup
 Base = declarative_base()
 DATABASE_URL = "sqlite:///webhooks.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///webhooks.db"
+
+def _json_serializer(value) -> str:
+    # orjson returns bytes; JSON columns must be stored as TEXT for SQLite's JSON functions
+    return orjson.dumps(value).decode()
+
+# WAL allows concurrent readers alongside the single writer, so keep a pool of
+# connections rather than funnelling every request through one
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 5},
+    poolclass=QueuePool,
+    pool_size=5,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    insertmanyvalues_page_size=1000,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads
+)
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragma(dbapi_conn, _):
+    """Apply WAL mode, cache/mmap sizing and other performance PRAGMAs to every new SQLite connection"""
+    cur = dbapi_conn.cursor()
+    # auto_vacuum only takes effect on a brand new database file, so it has to
+    # run before journal_mode=WAL writes the header; on existing files it is a no-op
+    cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA cache_size=-64000")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.execute("PRAGMA foreign_keys=ON")
+    cur.close()
+
+@event.listens_for(engine, "close")
+def _optimize_on_close(dbapi_conn, _):
+    """Let SQLite refresh stale planner statistics before a connection goes away"""
+    try:
+        dbapi_conn.execute("PRAGMA optimize")
+    except Exception as e:
+        logger.warning(f"PRAGMA optimize failed: {str(e)}")
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Async engine for endpoints that await the database instead of blocking the event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=5,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads
+)
+event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragma)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 def get_db():
     db = SessionLocal()
@@ -30,36 +90,66 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Initialize database tables
 def init_db():
     Base.metadata.create_all(engine,)
+    # Imported here: migrations imports this module for the engine and models
+    from app.database.migrations import run_migrations
+    run_migrations()
     logger.info("Database initiated")
 
+def _fast_id() -> str:
+    """Opaque random 128-bit primary key, cheaper to build than str(uuid.uuid4())"""
+    return os.urandom(16).hex()
+
+# Bound once so the hot timestamp path skips the module attribute lookups
+_now = datetime.now
+_utc = timezone.utc
+
 def get_utc_now():
-    return datetime.now(timezone.utc)
+    return _now(_utc)
+
+def timestamp_key(value):
+    """A DateTime column or bound datetime as millisecond text in one fixed format
+
+    SQLite compares DateTime values as text, and SQLite-written and bound values
+    can be formatted differently; comparing this key on both sides avoids that.
+    The format is a literal so the expression matches indexes built on it.
+    """
+    return func.strftime(literal_column("'%Y-%m-%d %H:%M:%f'"), value)
 
 
 class UserDB(Base):
     __tablename__ = 'users'
 
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String, primary_key=True, default=_fast_id)
     username = Column(String, unique=True, nullable=False)
     email = Column(String, unique=True, nullable=False, index=True)
     password_hash = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), default=get_utc_now)
     
     # GitHub integration fields
-    github_id = Column(String, unique=True, nullable=True)
+    github_id = Column(String, nullable=True)
     github_username = Column(String, nullable=True)
     github_access_token = Column(String, nullable=True)
     github_avatar_url = Column(String, nullable=True)
 
     # Relationship to webhooks
-    webhooks = relationship('RegisteredWebhookDB', back_populates='user', cascade='all, delete-orphan')
+    webhooks = relationship('RegisteredWebhookDB', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
     # Relationship to deployment configs
-    deployment_configs = relationship('DeploymentConfigDB', back_populates='user', cascade='all, delete-orphan')
+    deployment_configs = relationship('DeploymentConfigDB', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
     # Relationship to deployments
-    deployments = relationship('DeploymentDB', back_populates='user', cascade='all, delete-orphan')
+    deployments = relationship('DeploymentDB', back_populates='user', cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        # Most users have no linked GitHub account, so only index the ones that do;
+        # github_id = ? implies IS NOT NULL, which lets SQLite use the partial index
+        Index('ix_users_github_id', github_id, unique=True, sqlite_where=github_id.isnot(None)),
+    )
 
 
 # SQLAlchemy models
@@ -75,8 +165,8 @@ class EventDB(Base):
 class RegisteredWebhookDB(Base):
     __tablename__ = 'registered_webhooks'
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    repository = Column(String, nullable=False, index=True)
+    id = Column(String, primary_key=True, default=_fast_id)
+    repository = Column(String, nullable=False)
     hook_id = Column(String, nullable=False, unique=True)
     hook_url = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), default=get_utc_now)
@@ -88,18 +178,33 @@ class RegisteredWebhookDB(Base):
     # Relationship to user
     user = relationship('UserDB', back_populates='webhooks')
 
-    # Relationship to events
-    events = relationship('EventDB', secondary='webhook_events', back_populates='webhooks')
+    # Relationship to events, loaded for a whole result set with one IN query
+    events = relationship('EventDB', secondary='webhook_events', back_populates='webhooks', lazy='selectin')
     
     # Relationship to payloads
-    payloads = relationship('WebhookPayloadDB', back_populates='webhook', cascade='all, delete-orphan')
+    payloads = relationship('WebhookPayloadDB', back_populates='webhook', cascade='all, delete-orphan', passive_deletes=True)
+
+    # Repository lookups return newest-synced first; (repository, hook_id) lookups
+    # are already served by the unique index on hook_id. Listings sort and seek on
+    # webhook_synced_key, so the indexes are on that expression; id is the keyset
+    # pagination tie-breaker, so it is part of the sort key
+    __table_args__ = (
+        Index('ix_rw_repo_synced_key', repository, timestamp_key(last_synced).desc(), id.desc()),
+        Index('ix_rw_synced_key', timestamp_key(last_synced).desc(), id.desc()),
+    )
+
+
+# Sort and keyset key of registered webhooks, matching the ix_rw_*synced_key indexes
+webhook_synced_key = timestamp_key(RegisteredWebhookDB.last_synced)
 
 
 class WebhookPayloadDB(Base):
     __tablename__ = 'webhook_payloads'
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    webhook_id = Column(String, ForeignKey('registered_webhooks.id', ondelete='CASCADE'), index=True)
+    # Payload ids are never exposed, so use SQLite's rowid rather than a random string key;
+    # it keeps inserts append-only and every secondary index entry 8 bytes smaller
+    id = Column(Integer, primary_key=True)
+    webhook_id = Column(String, ForeignKey('registered_webhooks.id', ondelete='CASCADE'))
     repository = Column(JSON, nullable=False)
     pusher = Column(JSON, nullable=True)
     ref = Column(String, nullable=True)
@@ -108,6 +213,17 @@ class WebhookPayloadDB(Base):
     # Relationship to webhook
     webhook = relationship('RegisteredWebhookDB', back_populates='payloads')
 
+    __table_args__ = (
+        Index('ix_wp_webhook_received', webhook_id, received_at.desc()),
+        # Expression index for repository lookups; queries must use the same
+        # expression (see payload_repository_name) for SQLite to pick it
+        Index('ix_wp_repo_name_id', func.json_extract(repository, literal_column("'$.full_name'")), id.desc()),
+    )
+
+
+# Repository full name inside a webhook payload, matching the ix_wp_repo_name_id index
+payload_repository_name = func.json_extract(WebhookPayloadDB.repository, literal_column("'$.full_name'"))
+
 
 # Association table for many-to-many relationship
 class WebhookEvent(Base):
@@ -117,21 +233,35 @@ class WebhookEvent(Base):
     event_name = Column(String, ForeignKey('events.name', ondelete='CASCADE'), primary_key=True)
 
 
+# Requests at least this slow (ms) are covered by the ix_request_logs_slow partial index
+SLOW_REQUEST_MS = 500
+
 # API Request Logging Model
 class RequestLogDB(Base):
     __tablename__ = "request_logs"
 
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=get_utc_now)
     method = Column(String)
     path = Column(String)
     status_code = Column(Integer)
     response_time = Column(Float)
-    request_body = Column(Text)
-    response_body = Column(Text)
-    headers = Column(Text)
+    request_body = Column(JSON(none_as_null=True))
+    response_body = Column(JSON(none_as_null=True))
+    headers = Column(JSON(none_as_null=True))
     client_ip = Column(String)
     user_agent = Column(String, nullable=True)
+    user_id = Column(String, nullable=True)
+
+    # Composite indexes so "filter ... ORDER BY timestamp DESC LIMIT n" is an index range scan
+    __table_args__ = (
+        Index('ix_request_logs_time', timestamp.desc()),
+        Index('ix_request_logs_user_time', user_id, timestamp.desc()),
+        Index('ix_request_logs_path_time', path, timestamp.desc()),
+        # Partial indexes cover only the error / slow minority of rows
+        Index('ix_request_logs_errors', timestamp.desc(), sqlite_where=status_code >= 400),
+        Index('ix_request_logs_slow', response_time.desc(), sqlite_where=response_time >= SLOW_REQUEST_MS),
+    )
     
     def to_dict(self):
         return {
@@ -141,22 +271,22 @@ class RequestLogDB(Base):
             "path": self.path,
             "status_code": self.status_code,
             "response_time": self.response_time,
-            "request_body": json.loads(self.request_body) if self.request_body else None,
-            "response_body": json.loads(self.response_body) if self.response_body else None,
-            "headers": json.loads(self.headers) if self.headers else None,
+            "request_body": self.request_body,
+            "response_body": self.response_body,
+            "headers": self.headers,
             "client_ip": self.client_ip,
-            "user_agent": self.user_agent
+            "user_agent": self.user_agent,
+            "user_id": self.user_id
         }
     
     def broadcast_log(self):
         """Broadcast the log entry to connected WebSocket clients"""
-        log_dict = self.to_dict()
-        # Broadcast to the "all_logs" channel for clients wanting all logs
-        asyncio.create_task(log_manager.broadcast_log("all_logs", log_dict))
-        # Also broadcast to path-specific channels
-        asyncio.create_task(log_manager.broadcast_log(self.path, log_dict))
-        # Keep compatibility with "all" channel
-        asyncio.create_task(log_manager.broadcast_log("all", log_dict))
+        # "all_logs" is for clients wanting all logs, the path for path-specific
+        # clients, and "all" is kept for compatibility
+        channels = ["all_logs", self.path, "all"]
+        # Skip serialising the entry entirely when nobody is listening
+        if log_manager.has_subscribers(channels):
+            asyncio.create_task(log_manager.broadcast_log(channels, self.to_dict()))
 
 
 # Deployment Models
@@ -178,7 +308,7 @@ class DeploymentEnvironment(PyEnum):
 class DeploymentConfigDB(Base):
     __tablename__ = 'deployment_configs'
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String, primary_key=True, default=_fast_id)
     user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     repo_id = Column(String, nullable=False)
     repo_full_name = Column(String, nullable=False, index=True)
@@ -193,13 +323,18 @@ class DeploymentConfigDB(Base):
     user = relationship('UserDB', back_populates='deployment_configs')
     
     # Relationship to deployments
-    deployments = relationship('DeploymentDB', back_populates='config', cascade='all, delete-orphan')
+    deployments = relationship('DeploymentDB', back_populates='config', cascade='all, delete-orphan', passive_deletes=True)
+    
+    __table_args__ = (
+        # Push webhooks look up auto-deploy configs by repository and branch; only auto-deploy rows are indexed
+        Index('ix_cfg_repo_branch_auto', repo_full_name, branch, sqlite_where=auto_deploy.is_(True)),
+    )
 
 
 class DeploymentDB(Base):
     __tablename__ = 'deployments'
     
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = Column(String, primary_key=True, default=_fast_id)
     user_id = Column(String, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     config_id = Column(String, ForeignKey('deployment_configs.id', ondelete='CASCADE'), nullable=False)
     repo_full_name = Column(String, nullable=False, index=True)
@@ -211,7 +346,6 @@ class DeploymentDB(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     triggered_by = Column(String, nullable=True)
     manual_trigger = Column(Boolean, default=False)
-    logs = Column(JSON, nullable=False, default=list)
     error_message = Column(Text, nullable=True)
     
     # Relationship to user
@@ -220,3 +354,22 @@ class DeploymentDB(Base):
     # Relationship to deployment config
     config = relationship('DeploymentConfigDB', back_populates='deployments')
 
+
+class DeploymentLogFileDB(Base):
+    __tablename__ = 'deployment_log_files'
+    
+    # Written once a deployment finishes; the log itself is an append-only file (see deployment_logs)
+    deployment_id = Column(String, ForeignKey('deployments.id', ondelete='CASCADE'), primary_key=True)
+    path = Column(String, nullable=False)
+    first_ts = Column(DateTime(timezone=True), nullable=False)
+    last_ts = Column(DateTime(timezone=True), nullable=False)
+    size = Column(Integer, nullable=False)
+
+
+
+class RevokedTokenDB(Base):
+    __tablename__ = 'revoked_tokens'
+
+    # JWT ID of a revoked token, kept until the token would have expired anyway (see token_revocation)
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
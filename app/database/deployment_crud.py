@@ -1,16 +1,23 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from sqlalchemy.orm.attributes import flag_modified
-from datetime import datetime
-import uuid
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import and_, bindparam, delete, select
 import logging
 from typing import List, Optional, Dict, Any
 
-from app.database.database import DeploymentConfigDB, DeploymentDB, DeploymentStatus, DeploymentEnvironment
+from app.database import config_index
+from app.database.deployment_logs import append_deployment_logs, delete_deployment_log
+from app.database.database import (
+    DeploymentConfigDB, DeploymentDB, DeploymentStatus, DeploymentEnvironment, get_utc_now
+)
 from app.schemas.deployment_models import DeploymentConfig, DeploymentRequest, Deployment, DeploymentResult
 
 logger = logging.getLogger(__name__)
 
+# Served by the partial index ix_cfg_repo_branch_auto
+_AUTO_DEPLOY_CONFIGS_FOR_PUSH = select(DeploymentConfigDB).where(
+    DeploymentConfigDB.repo_full_name == bindparam("repo_full_name"),
+    DeploymentConfigDB.branch == bindparam("branch"),
+    DeploymentConfigDB.auto_deploy.is_(True)
+)
 
 # Deployment Configuration CRUD Operations
 def create_deployment_config(db: Session, user_id: str, config: DeploymentConfig) -> DeploymentConfigDB:
@@ -26,7 +33,7 @@ def create_deployment_config(db: Session, user_id: str, config: DeploymentConfig
     )
     db.add(db_config)
     db.commit()
-    db.refresh(db_config)
+    config_index.invalidate()
     logger.info(f"Created deployment config for {config.repo_full_name}")
     return db_config
 
@@ -41,9 +48,16 @@ def get_deployment_config(db: Session, repo_full_name: str, user_id: str) -> Opt
     ).first()
 
 
+def get_auto_deploy_configs_for_push(db: Session, repo_full_name: str, branch: str) -> List[DeploymentConfigDB]:
+    """Get every auto-deploy configuration for a repository and branch, across all users"""
+    return db.execute(
+        _AUTO_DEPLOY_CONFIGS_FOR_PUSH, {"repo_full_name": repo_full_name, "branch": branch}
+    ).scalars().all()
+
+
 def update_deployment_config(db: Session, config_id: str, config_data: Dict[str, Any]) -> Optional[DeploymentConfigDB]:
     """Update an existing deployment configuration"""
-    db_config = db.query(DeploymentConfigDB).filter(DeploymentConfigDB.id == config_id).first()
+    db_config = db.get(DeploymentConfigDB, config_id)
     if not db_config:
         return None
     
@@ -53,20 +67,21 @@ def update_deployment_config(db: Session, config_id: str, config_data: Dict[str,
             setattr(db_config, key, value)
     
     db.commit()
-    db.refresh(db_config)
+    config_index.invalidate()
     logger.info(f"Updated deployment config {config_id}")
     return db_config
 
 
 def delete_deployment_config(db: Session, config_id: str, user_id: str) -> bool:
     """Delete a deployment configuration"""
-    result = db.query(DeploymentConfigDB).filter(
-        and_(
+    result = db.execute(
+        delete(DeploymentConfigDB).where(
             DeploymentConfigDB.id == config_id,
             DeploymentConfigDB.user_id == user_id
-        )
-    ).delete()
+        ).execution_options(synchronize_session=False)
+    ).rowcount
     db.commit()
+    config_index.invalidate()
     logger.info(f"Deleted deployment config {config_id}")
     return result > 0
 
@@ -87,35 +102,44 @@ def create_deployment(db: Session, user_id: str, request: DeploymentRequest) ->
     
     # Create deployment
     deployment = DeploymentDB(
-        id=str(uuid.uuid4()),
         user_id=user_id,
         config_id=config.id,
         repo_full_name=request.repo_full_name,
         commit_sha=request.commit_sha,
         branch=request.branch,
         status=DeploymentStatus.PENDING.value,
-        created_at=datetime.now(),
+        created_at=get_utc_now(),
         triggered_by=request.triggered_by,
-        manual_trigger=request.manual_trigger,
-        logs=[]
+        manual_trigger=request.manual_trigger
     )
     
     db.add(deployment)
     db.commit()
-    db.refresh(deployment)
     logger.info(f"Created deployment {deployment.id} for {request.repo_full_name}")
     return deployment
 
 
 def get_deployment(db: Session, deployment_id: str) -> Optional[DeploymentDB]:
     """Get a deployment by ID"""
-    return db.query(DeploymentDB).filter(DeploymentDB.id == deployment_id).first()
+    return db.get(DeploymentDB, deployment_id)
 
 
 def list_deployments(db: Session, repo_full_name: Optional[str] = None, user_id: Optional[str] = None, 
                     limit: int = 10, offset: int = 0) -> List[DeploymentDB]:
     """List deployments with optional filtering"""
-    query = db.query(DeploymentDB)
+    # Only load the columns shown in deployment listings
+    query = db.query(DeploymentDB).options(load_only(
+        DeploymentDB.id,
+        DeploymentDB.repo_full_name,
+        DeploymentDB.commit_sha,
+        DeploymentDB.branch,
+        DeploymentDB.status,
+        DeploymentDB.created_at,
+        DeploymentDB.started_at,
+        DeploymentDB.completed_at,
+        DeploymentDB.triggered_by,
+        DeploymentDB.manual_trigger
+    ))
     
     if repo_full_name:
         query = query.filter(DeploymentDB.repo_full_name == repo_full_name)
@@ -127,8 +151,12 @@ def list_deployments(db: Session, repo_full_name: Optional[str] = None, user_id:
 
 
 def update_deployment_status(db: Session, deployment_id: str, status: DeploymentStatus, 
-                             logs: Optional[List[str]] = None, error_message: Optional[str] = None) -> Optional[DeploymentDB]:
-    """Update deployment status and logs"""
+                             logs: Optional[List[str]] = None, error_message: Optional[str] = None,
+                             commit: bool = True) -> Optional[DeploymentDB]:
+    """Update deployment status and logs
+
+    With commit=False the change is only flushed, for callers committing it with other writes.
+    """
     deployment = get_deployment(db, deployment_id)
     if not deployment:
         logger.error(f"Deployment {deployment_id} not found")
@@ -137,59 +165,38 @@ def update_deployment_status(db: Session, deployment_id: str, status: Deployment
     deployment.status = status.value
     
     if status == DeploymentStatus.IN_PROGRESS and not deployment.started_at:
-        deployment.started_at = datetime.now()
+        deployment.started_at = get_utc_now()
     
     if status in [DeploymentStatus.COMPLETED, DeploymentStatus.FAILED, DeploymentStatus.CANCELLED]:
-        deployment.completed_at = datetime.now()
+        deployment.completed_at = get_utc_now()
     
     if logs:
-        current_logs = deployment.logs or []
-        deployment.logs = current_logs + logs
+        append_deployment_logs(deployment_id, logs)
     
     if error_message:
         deployment.error_message = error_message
     
-    db.commit()
-    db.refresh(deployment)
+    if commit:
+        db.commit()
+    else:
+        db.flush()
     logger.info(f"Updated deployment {deployment_id} status to {status.value}")
     return deployment
 
 
-def add_deployment_log(db: Session, deployment_id: str, log_message: str) -> Optional[DeploymentDB]:
-    """Add a log message to a deployment"""
-    deployment = get_deployment(db, deployment_id)
-    if not deployment:
-        logger.error(f"Deployment {deployment_id} not found")
-        return None
-    
-    # Add log message
-    timestamp = datetime.now().isoformat()
-    log_entry = f"[{timestamp}] {log_message}"
-    
-    # Ensure deployment.logs is treated as a mutable list
-    current_logs = list(deployment.logs) if deployment.logs else []
-    current_logs.append(log_entry)
-    deployment.logs = current_logs
-    
-    # Mark the 'logs' field as modified for SQLAlchemy's change detection
-    flag_modified(deployment, "logs")
-    
-    db.commit()
-    db.refresh(deployment)
-    return deployment
-
-
 def delete_deployment(db: Session, deployment_id: str, user_id: str) -> bool:
     """Delete a deployment record
     
     This permanently removes a deployment record from the database.
     """
-    result = db.query(DeploymentDB).filter(
-        and_(
+    result = db.execute(
+        delete(DeploymentDB).where(
             DeploymentDB.id == deployment_id,
             DeploymentDB.user_id == user_id
-        )
-    ).delete()
+        ).execution_options(synchronize_session=False)
+    ).rowcount
     db.commit()
+    if result:
+        delete_deployment_log(deployment_id)
     logger.info(f"Deleted deployment {deployment_id}")
     return result > 0 
\ No newline at end of file
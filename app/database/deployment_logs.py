@@ -0,0 +1,193 @@
+"""
+Append-only deployment log files.
+
+Each deployment's log is a flat file of length-prefixed records, so appending
+a batch of lines is one write() and reading is a sequential scan from any
+record boundary. When a deployment finishes, one deployment_log_files row
+records the file's size and time range.
+
+Record layout: struct "<QI" (timestamp in ns since the epoch, message length)
+followed by the UTF-8 message.
+"""
+import logging
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.database.database import DeploymentDB, DeploymentLogFileDB
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_RECORD_HEADER = struct.Struct("<QI")
+
+
+class DeploymentLogLine(NamedTuple):
+    ts: datetime
+    message: str
+    # Byte offset just past this record; pass it as `after` to read only later lines
+    offset: int
+
+    def to_log_line(self) -> str:
+        """Format the entry as a timestamped log line"""
+        return f"[{self.ts.isoformat()}] {self.message}"
+
+
+def log_path(deployment_id: str) -> str:
+    """Path of a deployment's log file"""
+    return os.path.join(settings.DEPLOY_LOG_DIR, f"{deployment_id}.log")
+
+
+def _encode_records(entries: Iterable[Tuple[int, str]]) -> bytearray:
+    """Encode (timestamp ns, message) pairs as consecutive records"""
+    records = bytearray()
+    for ts, message in entries:
+        data = message.encode("utf-8", "replace")
+        records += _RECORD_HEADER.pack(ts, len(data))
+        records += data
+    return records
+
+
+def _write_records(deployment_id: str, records: bytearray, mode: str):
+    try:
+        with open(log_path(deployment_id), mode) as f:
+            f.write(records)
+    except FileNotFoundError:
+        os.makedirs(settings.DEPLOY_LOG_DIR, exist_ok=True)
+        with open(log_path(deployment_id), mode) as f:
+            f.write(records)
+
+
+def append_deployment_logs(deployment_id: str, log_messages: Iterable[str]):
+    """Append log messages to a deployment's log file in a single write"""
+    ts = time.time_ns()
+    records = _encode_records((ts, message) for message in log_messages)
+    if records:
+        _write_records(deployment_id, records, "ab")
+
+
+def append_deployment_log(deployment_id: str, log_message: str):
+    """Append a log message to a deployment's log file"""
+    append_deployment_logs(deployment_id, (log_message,))
+
+
+def _iter_records(data: bytes, start: int):
+    """Yield (ts_ns, message bytes, end offset) for each complete record in data"""
+    pos = 0
+    header_size = _RECORD_HEADER.size
+    while pos + header_size <= len(data):
+        ts_ns, length = _RECORD_HEADER.unpack_from(data, pos)
+        end = pos + header_size + length
+        # A record still being written is left for the next read
+        if end > len(data):
+            break
+        yield ts_ns, data[pos + header_size:end], start + end
+        pos = end
+
+
+def get_deployment_logs(deployment_id: str, after: int = 0,
+                        limit: Optional[int] = None) -> List[DeploymentLogLine]:
+    """Read a deployment's log lines in order, starting at byte offset `after`"""
+    try:
+        with open(log_path(deployment_id), "rb") as f:
+            f.seek(after)
+            data = f.read()
+    except FileNotFoundError:
+        return []
+
+    lines = []
+    for ts_ns, message, offset in _iter_records(data, after):
+        lines.append(DeploymentLogLine(
+            datetime.fromtimestamp(ts_ns / 1e9, timezone.utc),
+            message.decode("utf-8", "replace"),
+            offset
+        ))
+        if limit and len(lines) >= limit:
+            break
+    return lines
+
+
+def _index_statement(deployment_id: str):
+    """Upsert of a deployment's deployment_log_files row, or None if it has no log records"""
+    path = log_path(deployment_id)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+
+    first_ts = last_ts = None
+    size = 0
+    for ts_ns, _, size in _iter_records(data, 0):
+        if first_ts is None:
+            first_ts = ts_ns
+        last_ts = ts_ns
+    if first_ts is None:
+        return None
+
+    values = {
+        "deployment_id": deployment_id,
+        "path": path,
+        "first_ts": datetime.fromtimestamp(first_ts / 1e9, timezone.utc),
+        "last_ts": datetime.fromtimestamp(last_ts / 1e9, timezone.utc),
+        "size": size
+    }
+    stmt = sqlite_insert(DeploymentLogFileDB).values(**values)
+    return stmt.on_conflict_do_update(index_elements=["deployment_id"], set_=values)
+
+
+def index_deployment_log(db: Session, deployment_id: str, commit: bool = True):
+    """Record a finished deployment's log file size and time range in deployment_log_files
+
+    With commit=False the row is written in the session's open transaction.
+    """
+    stmt = _index_statement(deployment_id)
+    if stmt is not None:
+        db.execute(stmt)
+        if commit:
+            db.commit()
+
+
+def import_deployment_log(conn: Connection, deployment_id: str, entries: Iterable[Tuple[int, str]]):
+    """Write a log kept by an older storage layout to the deployment's file and index it on conn
+
+    The file is rewritten rather than appended to, so an import that is
+    interrupted and run again does not duplicate lines. Nothing is committed.
+    """
+    _write_records(deployment_id, _encode_records(entries), "wb")
+    stmt = _index_statement(deployment_id)
+    if stmt is not None:
+        conn.execute(stmt)
+
+
+def delete_deployment_log(deployment_id: str):
+    """Remove a deployment's log file"""
+    try:
+        os.remove(log_path(deployment_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Failed to delete log file of deployment {deployment_id}: {str(e)}")
+
+
+def prune_deployment_logs(db: Session) -> int:
+    """Delete log files of deployments that no longer exist, e.g. removed along with their user or config"""
+    try:
+        names = os.listdir(settings.DEPLOY_LOG_DIR)
+    except FileNotFoundError:
+        return 0
+    log_ids = {name[:-len(".log")] for name in names if name.endswith(".log")}
+    if not log_ids:
+        return 0
+    existing = set(db.scalars(select(DeploymentDB.id).where(DeploymentDB.id.in_(log_ids))))
+    orphans = log_ids - existing
+    for deployment_id in orphans:
+        delete_deployment_log(deployment_id)
+    return len(orphans)
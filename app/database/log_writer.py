@@ -0,0 +1,150 @@
+"""
+Background writer that batches API request log inserts.
+
+Request logs are queued by the logging middleware and written by a single
+task in groups, so the request path never waits on a per-row commit. The
+inserts run on a dedicated writer thread so a flush never blocks the event loop.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal, RequestLogDB, engine
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many rows are queued or the oldest row has waited this long
+BATCH_SIZE = 500
+BATCH_TIMEOUT = 0.2  # seconds
+
+# Created on startup so it is bound to the running event loop
+queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+_writer_thread: Optional[ThreadPoolExecutor] = None
+# The writer thread holds one connection for its lifetime so every batch reuses the
+# same warm SQLite page cache instead of checking a connection out per flush. Both
+# are opened, used and closed only on that thread, since a Session is not thread safe
+_writer_connection: Optional[Connection] = None
+_writer_session: Optional[Session] = None
+
+
+def enqueue(row: Dict[str, Any]):
+    """Queue a request log row, writing it directly if the writer is not running"""
+    if queue is None:
+        if write_batch([row]):
+            _broadcast([row])
+        return
+    queue.put_nowait(row)
+
+
+def write_batch(batch: List[Dict[str, Any]], session: Optional[Session] = None) -> bool:
+    """Insert a batch of request log rows in one transaction, on a new session unless one is given"""
+    db = session or SessionLocal()
+    try:
+        # return_defaults populates the generated ids back into the row dicts
+        db.bulk_insert_mappings(RequestLogDB, batch, return_defaults=True)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error writing {len(batch)} request logs: {str(e)}")
+        return False
+    finally:
+        if db is not session:
+            db.close()
+    return True
+
+
+def _open_writer_session():
+    global _writer_connection, _writer_session
+    _writer_connection = engine.connect()
+    _writer_session = SessionLocal(bind=_writer_connection)
+
+
+def _close_writer_session():
+    global _writer_connection, _writer_session
+    _writer_session.close()
+    _writer_connection.close()
+    _writer_session = None
+    _writer_connection = None
+
+
+def _write_on_writer_thread(batch: List[Dict[str, Any]]) -> bool:
+    return write_batch(batch, _writer_session)
+
+
+def _broadcast(batch: List[Dict[str, Any]]):
+    """Send written rows to log websocket subscribers; must run on the event loop"""
+    for row in batch:
+        RequestLogDB(**row).broadcast_log()
+
+
+async def _flush(batch: List[Dict[str, Any]]):
+    """Write a batch on the writer thread, then broadcast it"""
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(_writer_thread, _write_on_writer_thread, batch):
+        _broadcast(batch)
+
+
+async def drain(q: asyncio.Queue, write: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+                batch_size: int, batch_timeout: float):
+    """Drain a queue forever, awaiting write on batches of up to batch_size"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await q.get()]
+        deadline = loop.time() + batch_timeout
+        try:
+            while len(batch) < batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(q.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            # Runs on cancellation too, so rows already taken off the queue are kept
+            await write(batch)
+
+
+async def writer_loop():
+    """Drain the queue, grouping rows into batches of up to BATCH_SIZE"""
+    await drain(queue, _flush, BATCH_SIZE, BATCH_TIMEOUT)
+
+
+def start():
+    """Create the queue and start the writer task on the running loop"""
+    global queue, _writer_task, _writer_thread
+    _writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="request-log-writer")
+    # The executor runs jobs in order, so the session is open before the first batch
+    _writer_thread.submit(_open_writer_session)
+    queue = asyncio.Queue()
+    _writer_task = asyncio.create_task(writer_loop())
+
+
+async def stop():
+    """Stop the writer task and flush any rows still queued"""
+    global queue, _writer_task, _writer_thread
+    if _writer_task:
+        _writer_task.cancel()
+        try:
+            await _writer_task
+        except asyncio.CancelledError:
+            pass
+        _writer_task = None
+
+    if queue is not None:
+        remaining = []
+        while not queue.empty():
+            remaining.append(queue.get_nowait())
+        queue = None
+        if remaining:
+            await _flush(remaining)
+
+    if _writer_thread is not None:
+        _writer_thread.submit(_close_writer_session)
+        _writer_thread.shutdown()
+        _writer_thread = None
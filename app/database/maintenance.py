@@ -0,0 +1,96 @@
+"""
+Periodic SQLite maintenance.
+
+Refreshes planner statistics, truncates the WAL (which otherwise keeps growing
+under the request log write load) and returns free pages to the filesystem.
+Also deletes log files left behind by deployments removed in a cascade and
+revocations of tokens that have since expired.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from app.database.database import SessionLocal, engine
+from app.database.deployment_logs import prune_deployment_logs
+from app.database.token_revocation import prune_revoked_tokens
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = 24 * 60 * 60  # seconds
+
+_maintenance_task: Optional[asyncio.Task] = None
+
+
+def run_maintenance():
+    """Run ANALYZE, reclaim free pages, and checkpoint and truncate the WAL"""
+    dbapi_conn = engine.raw_connection()
+    try:
+        cur = dbapi_conn.cursor()
+        cur.execute("ANALYZE")
+        dbapi_conn.commit()
+        free_pages = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        # cursor.execute only steps the pragma once, freeing a single page;
+        # executescript runs it to completion
+        dbapi_conn.executescript("PRAGMA incremental_vacuum;")
+        freed = free_pages - cur.execute("PRAGMA freelist_count").fetchone()[0]
+        # Last, so the pages written by the vacuum are checkpointed too
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        cur.close()
+        logger.info(f"Database maintenance completed, {freed} free pages reclaimed")
+    except Exception as e:
+        logger.error(f"Database maintenance failed: {str(e)}")
+    finally:
+        dbapi_conn.close()
+
+
+def prune_logs():
+    """Delete log files of deployments that no longer exist"""
+    db = SessionLocal()
+    try:
+        pruned = prune_deployment_logs(db)
+        if pruned:
+            logger.info(f"Deleted {pruned} orphaned deployment log files")
+    except Exception as e:
+        logger.error(f"Deployment log pruning failed: {str(e)}")
+    finally:
+        db.close()
+
+
+def prune_revocations():
+    """Delete revocations of tokens that have expired"""
+    db = SessionLocal()
+    try:
+        pruned = prune_revoked_tokens(db)
+        if pruned:
+            logger.info(f"Deleted {pruned} expired token revocations")
+    except Exception as e:
+        logger.error(f"Token revocation pruning failed: {str(e)}")
+    finally:
+        db.close()
+
+
+async def maintenance_loop():
+    """Run maintenance once every MAINTENANCE_INTERVAL"""
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+        await asyncio.to_thread(run_maintenance)
+        await asyncio.to_thread(prune_logs)
+        await asyncio.to_thread(prune_revocations)
+
+
+def start():
+    """Start the maintenance task on the running loop"""
+    global _maintenance_task
+    _maintenance_task = asyncio.create_task(maintenance_loop())
+
+
+async def stop():
+    """Cancel the maintenance task"""
+    global _maintenance_task
+    if _maintenance_task:
+        _maintenance_task.cancel()
+        try:
+            await _maintenance_task
+        except asyncio.CancelledError:
+            pass
+        _maintenance_task = None
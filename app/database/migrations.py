@@ -0,0 +1,162 @@
+"""
+In-place upgrades for databases created by earlier versions of the schema.
+
+init_db creates missing tables with create_all, which never alters a table
+that already exists. Each step here inspects the live schema and only acts
+while the old layout is still present, so running them on every startup is
+safe; all of them but the one-off VACUUM run in one transaction.
+"""
+import logging
+import time
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, Tuple
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.database.database import Base, WebhookPayloadDB, engine
+from app.database.deployment_logs import import_deployment_log
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn: Connection, table: str) -> Dict[str, str]:
+    """Map a table's column names to their declared types"""
+    return {row[1]: row[2] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def _add_request_log_user_id(conn: Connection):
+    """request_logs.user_id was added for per-user log queries"""
+    if "user_id" not in _columns(conn, "request_logs"):
+        conn.execute(text("ALTER TABLE request_logs ADD COLUMN user_id VARCHAR"))
+        logger.info("Added request_logs.user_id")
+
+
+def _parse_log_lines(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """Split "[timestamp] message" lines into (timestamp ns, message)"""
+    ts = time.time_ns()
+    for line in lines:
+        message = line
+        if line.startswith("[") and "] " in line:
+            stamp, message = line[1:].split("] ", 1)
+            try:
+                # Naive stamps were written with datetime.now(), i.e. local time
+                ts = int(datetime.fromisoformat(stamp).timestamp() * 1e9)
+            except ValueError:
+                message = line
+        # Lines without a readable stamp keep the previous line's time
+        yield ts, message
+
+
+def _move_deployment_log_column(conn: Connection):
+    """deployments.logs held each deployment's lines as a JSON list; logs now live in files"""
+    if "logs" not in _columns(conn, "deployments"):
+        return
+    rows = conn.execute(text("SELECT id, logs FROM deployments WHERE logs IS NOT NULL AND logs != '[]'"))
+    count = 0
+    for deployment_id, logs in rows.all():
+        import_deployment_log(conn, deployment_id, _parse_log_lines(orjson.loads(logs)))
+        count += 1
+    # The NOT NULL column would otherwise reject every new deployment row
+    conn.execute(text("ALTER TABLE deployments DROP COLUMN logs"))
+    logger.info(f"Moved the logs of {count} deployments to files and dropped deployments.logs")
+
+
+def _move_deployment_log_entries(conn: Connection):
+    """deployment_log_entries held one row per log line; logs now live in files"""
+    if not _columns(conn, "deployment_log_entries"):
+        return
+    rows = conn.execute(text(
+        "SELECT deployment_id, ts, message FROM deployment_log_entries "
+        "WHERE deployment_id IN (SELECT id FROM deployments) ORDER BY deployment_id, seq"
+    ))
+    count = 0
+    for deployment_id, entries in groupby(rows, key=itemgetter(0)):
+        import_deployment_log(conn, deployment_id, (
+            # Stored as naive UTC text
+            (int(datetime.fromisoformat(ts).replace(tzinfo=timezone.utc).timestamp() * 1e9), message)
+            for _, ts, message in entries
+        ))
+        count += 1
+    conn.execute(text("DROP TABLE deployment_log_entries"))
+    logger.info(f"Moved the logs of {count} deployments to files and dropped deployment_log_entries")
+
+
+def _rebuild_webhook_payloads(conn: Connection):
+    """webhook_payloads.id was a random UUID string; it is now the integer rowid
+
+    SQLite cannot change a primary key in place, so the table is rebuilt and
+    the payloads are renumbered in the order they were received.
+    """
+    if _columns(conn, "webhook_payloads").get("id", "INTEGER") == "INTEGER":
+        return
+    conn.execute(text("ALTER TABLE webhook_payloads RENAME TO _webhook_payloads_old"))
+    # Renamed tables keep their index names, which the new table needs
+    for name in conn.scalars(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' "
+        "AND tbl_name = '_webhook_payloads_old' AND sql IS NOT NULL"
+    )).all():
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    WebhookPayloadDB.__table__.create(conn)
+    # Payloads of webhooks deleted while foreign keys were not enforced would fail the insert
+    count = conn.execute(text(
+        "INSERT INTO webhook_payloads (webhook_id, repository, pusher, ref, received_at) "
+        "SELECT webhook_id, repository, pusher, ref, received_at FROM _webhook_payloads_old "
+        "WHERE webhook_id IS NULL OR webhook_id IN (SELECT id FROM registered_webhooks) "
+        "ORDER BY received_at, id"
+    )).rowcount
+    conn.execute(text("DROP TABLE _webhook_payloads_old"))
+    logger.info(f"Rebuilt webhook_payloads with integer ids ({count} payloads)")
+
+
+def _drop_replaced_indexes(conn: Connection):
+    """Indexes superseded by ones under a new name, which create_all would leave behind"""
+    for name in ("ix_wp_repo_name", "ix_rw_synced", "ix_rw_repo_synced"):
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _create_missing_indexes(conn: Connection):
+    """Create indexes that were defined after their table already existed"""
+    # Looked up by name: checkfirst cannot reflect expression indexes
+    existing = set(conn.scalars(text("SELECT name FROM sqlite_master WHERE type = 'index'")))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                logger.info(f"Created index {index.name}")
+
+
+def _enable_incremental_vacuum():
+    """auto_vacuum only takes effect on new database files unless followed by a VACUUM
+
+    Databases created before the connect hook set auto_vacuum=INCREMENTAL are
+    still NONE, where the maintenance task's incremental_vacuum does nothing.
+    VACUUM cannot run inside a transaction, so this uses its own connection.
+    """
+    dbapi_conn = engine.raw_connection()
+    try:
+        cur = dbapi_conn.cursor()
+        if cur.execute("PRAGMA auto_vacuum").fetchone()[0] == 0:
+            logger.info("Rebuilding the database file to enable incremental auto_vacuum")
+            dbapi_conn.commit()
+            cur.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            cur.execute("VACUUM")
+        cur.close()
+    finally:
+        dbapi_conn.close()
+
+
+def run_migrations():
+    """Bring an existing database up to the current schema"""
+    _enable_incremental_vacuum()
+    with engine.begin() as conn:
+        _add_request_log_user_id(conn)
+        _move_deployment_log_column(conn)
+        _move_deployment_log_entries(conn)
+        _rebuild_webhook_payloads(conn)
+        _drop_replaced_indexes(conn)
+        # Last, so indexes over columns added above can be built
+        _create_missing_indexes(conn)
@@ -0,0 +1,102 @@
+"""
+Background writer that batches webhook payload inserts.
+
+Incoming webhook payloads are queued by the webhook route and inserted by a
+single task with one executemany INSERT and one commit per batch, instead of
+one transaction (and one WAL fsync) per delivery. The inserts run on a
+dedicated writer thread so a flush never blocks the event loop.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.database.database import SessionLocal, WebhookPayloadDB
+from app.database.log_writer import drain
+
+logger = logging.getLogger(__name__)
+
+# Flush when this many payloads are queued or the oldest has waited this long
+BATCH_SIZE = 200
+BATCH_TIMEOUT = 0.05  # seconds
+# Beyond this backlog payloads are written inline rather than queued
+MAX_QUEUED = 10_000
+
+# Created on startup so it is bound to the running event loop
+queue: Optional[asyncio.Queue] = None
+_writer_task: Optional[asyncio.Task] = None
+_writer_thread: Optional[ThreadPoolExecutor] = None
+
+
+def enqueue(row: Dict[str, Any]) -> bool:
+    """Queue a webhook payload row, inserting it directly if it cannot be queued"""
+    if queue is not None:
+        try:
+            queue.put_nowait(row)
+            return True
+        except asyncio.QueueFull:
+            pass
+    return write_batch([row])
+
+
+def write_batch(batch: List[Dict[str, Any]]) -> bool:
+    """Insert a batch of webhook payload rows in one transaction
+
+    If the batch fails, e.g. on a payload whose webhook was deleted meanwhile,
+    the rows are retried one at a time so only the failing ones are dropped.
+    Returns whether every row was written.
+    """
+    db = SessionLocal()
+    try:
+        db.execute(insert(WebhookPayloadDB), batch)
+        db.commit()
+        return True
+    except Exception as e:
+        db.rollback()
+        if len(batch) == 1:
+            logger.error(f"Error writing webhook payload: {str(e)}")
+            return False
+        logger.warning(f"Error writing {len(batch)} webhook payloads, retrying one by one: {str(e)}")
+    finally:
+        db.close()
+
+    return sum(not write_batch([row]) for row in batch) == 0
+
+
+async def _flush(batch: List[Dict[str, Any]]):
+    """Write a batch on the writer thread"""
+    await asyncio.get_running_loop().run_in_executor(_writer_thread, write_batch, batch)
+
+
+def start():
+    """Create the queue and start the writer task on the running loop"""
+    global queue, _writer_task, _writer_thread
+    _writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webhook-payload-writer")
+    queue = asyncio.Queue(maxsize=MAX_QUEUED)
+    _writer_task = asyncio.create_task(drain(queue, _flush, BATCH_SIZE, BATCH_TIMEOUT))
+
+
+async def stop():
+    """Stop the writer task and flush any payloads still queued"""
+    global queue, _writer_task, _writer_thread
+    if _writer_task:
+        _writer_task.cancel()
+        try:
+            await _writer_task
+        except asyncio.CancelledError:
+            pass
+        _writer_task = None
+
+    if queue is not None:
+        remaining = []
+        while not queue.empty():
+            remaining.append(queue.get_nowait())
+        queue = None
+        if remaining:
+            await _flush(remaining)
+
+    if _writer_thread is not None:
+        _writer_thread.shutdown()
+        _writer_thread = None
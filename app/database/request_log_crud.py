@@ -0,0 +1,75 @@
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+import logging
+from typing import List, Optional, Dict, Any
+
+from app.database import log_writer
+from app.database.database import RequestLogDB, SLOW_REQUEST_MS, get_utc_now
+
+logger = logging.getLogger(__name__)
+
+# Statements are built once so SQLAlchemy's compiled cache is hit on every call
+_ALL_LOGS = select(RequestLogDB).order_by(RequestLogDB.timestamp.desc())
+_RECENT_LOGS = _ALL_LOGS.limit(bindparam("limit"))
+_LOGS_BY_USER = select(RequestLogDB).where(
+    RequestLogDB.user_id == bindparam("user_id")
+).order_by(RequestLogDB.timestamp.desc()).limit(bindparam("limit"))
+_LOGS_BY_ENDPOINT = select(RequestLogDB).where(
+    RequestLogDB.path == bindparam("endpoint")
+).order_by(RequestLogDB.timestamp.desc()).limit(bindparam("limit"))
+_ERROR_LOGS = select(RequestLogDB).where(
+    RequestLogDB.status_code >= 400
+).order_by(RequestLogDB.timestamp.desc()).limit(bindparam("limit"))
+_SLOW_REQUESTS = select(RequestLogDB).where(
+    RequestLogDB.response_time >= bindparam("threshold_ms")
+).order_by(RequestLogDB.response_time.desc()).limit(bindparam("limit"))
+# SQLite only uses a partial index when the query repeats its condition literally
+_INDEXED_SLOW_REQUESTS = _SLOW_REQUESTS.where(RequestLogDB.response_time >= SLOW_REQUEST_MS)
+
+
+def create_request_log(method: str, path: str, status_code: int, response_time: float,
+                       request_body: Optional[Any] = None, response_body: Optional[Any] = None,
+                       headers: Optional[Dict[str, Any]] = None, client_ip: Optional[str] = None,
+                       user_agent: Optional[str] = None, user_id: Optional[str] = None):
+    """Queue an API request log entry for the background batch writer"""
+    log_writer.enqueue({
+        "timestamp": get_utc_now(),
+        "method": method,
+        "path": path,
+        "status_code": status_code,
+        "response_time": response_time,
+        "request_body": request_body or None,
+        "response_body": response_body or None,
+        "headers": headers or None,
+        "client_ip": client_ip,
+        "user_agent": user_agent,
+        "user_id": user_id
+    })
+
+
+def get_recent_logs(db: Session, limit: Optional[int] = None) -> List[RequestLogDB]:
+    """Get request logs, newest first"""
+    if limit:
+        return db.scalars(_RECENT_LOGS, {"limit": limit}).all()
+    return db.scalars(_ALL_LOGS).all()
+
+
+def get_logs_by_user(db: Session, user_id: str, limit: int = 100) -> List[RequestLogDB]:
+    """Get the most recent request logs made by a user"""
+    return db.scalars(_LOGS_BY_USER, {"user_id": user_id, "limit": limit}).all()
+
+
+def get_logs_by_endpoint(db: Session, endpoint: str, limit: int = 100) -> List[RequestLogDB]:
+    """Get the most recent request logs for an endpoint path"""
+    return db.scalars(_LOGS_BY_ENDPOINT, {"endpoint": endpoint, "limit": limit}).all()
+
+
+def get_error_logs(db: Session, limit: int = 100) -> List[RequestLogDB]:
+    """Get the most recent requests that returned an error status"""
+    return db.scalars(_ERROR_LOGS, {"limit": limit}).all()
+
+
+def get_slow_requests(db: Session, threshold_ms: int = 500, limit: int = 100) -> List[RequestLogDB]:
+    """Get the slowest requests taking at least threshold_ms"""
+    stmt = _INDEXED_SLOW_REQUESTS if threshold_ms >= SLOW_REQUEST_MS else _SLOW_REQUESTS
+    return db.scalars(stmt, {"threshold_ms": threshold_ms, "limit": limit}).all()
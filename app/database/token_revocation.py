@@ -0,0 +1,70 @@
+"""
+Revoked JWT IDs.
+
+A revoked token's jti is stored in revoked_tokens until the token would have
+expired anyway. verify_token checks every token against an in-memory set of
+those IDs, so the check costs a set lookup rather than a query. The set is
+reloaded from the table every REVOCATION_REFRESH seconds, which also picks up
+revocations made by other processes; revocations made here apply at once.
+"""
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Optional, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.database.database import RevokedTokenDB, SessionLocal, get_utc_now
+
+# Upper bound on how long a token revoked by another process stays usable here
+REVOCATION_REFRESH = 30  # seconds
+
+_revoked: Set[str] = set()
+_loaded_at: Optional[float] = None
+# verify_token also runs in sync routes on the threadpool
+_lock = Lock()
+
+
+def _refresh():
+    """Reload the revoked IDs from the database if the set is older than REVOCATION_REFRESH"""
+    global _revoked, _loaded_at
+    with _lock:
+        now = time.monotonic()
+        if _loaded_at is not None and now - _loaded_at < REVOCATION_REFRESH:
+            return
+        db = SessionLocal()
+        try:
+            _revoked = set(db.scalars(
+                select(RevokedTokenDB.jti).where(RevokedTokenDB.expires_at > get_utc_now())
+            ))
+        finally:
+            db.close()
+        _loaded_at = now
+
+
+def is_revoked(jti: Optional[str]) -> bool:
+    """Whether the token with this JWT ID has been revoked; tokens without one cannot be"""
+    if not jti:
+        return False
+    _refresh()
+    return jti in _revoked
+
+
+def revoke_token(db: Session, jti: str, exp: int):
+    """Revoke the token with this JWT ID until its expiry time (epoch seconds)"""
+    stmt = sqlite_insert(RevokedTokenDB).values(
+        jti=jti, expires_at=datetime.fromtimestamp(exp, timezone.utc)
+    ).on_conflict_do_nothing(index_elements=["jti"])
+    with _lock:
+        db.execute(stmt)
+        db.commit()
+        _revoked.add(jti)
+
+
+def prune_revoked_tokens(db: Session) -> int:
+    """Delete revocations of tokens that have expired since"""
+    result = db.execute(delete(RevokedTokenDB).where(RevokedTokenDB.expires_at <= get_utc_now()))
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,80 @@
+"""
+Process-local TTL cache for hot user lookups.
+
+Users are looked up by ID or email on nearly every authenticated request.
+Rows are cached as plain column dicts rather than ORM instances and are
+attached to the caller's session on a hit, so no instance is ever shared
+between sessions. Entries expire after USER_CACHE_TTL seconds and are
+dropped explicitly whenever user_crud changes a user.
+"""
+from threading import Lock
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from app.database.database import UserDB
+
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL = 60  # seconds
+
+_by_id: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+_by_email: TTLCache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# TTLCache is not thread safe and sync routes run in a threadpool
+_lock = Lock()
+
+_COLUMN_KEYS = [attr.key for attr in inspect(UserDB).column_attrs]
+
+
+def _attach(db: Session, row: Dict[str, Any]) -> UserDB:
+    """Rebuild a cached row as a persistent instance in the given session without a SELECT"""
+    user = UserDB(**row)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def get_by_id(db: Session, user_id: str) -> Optional[UserDB]:
+    """Return the cached user with this ID, or None on a miss"""
+    with _lock:
+        row = _by_id.get(user_id)
+    return _attach(db, row) if row else None
+
+
+def get_row(user_id: str) -> Optional[Dict[str, Any]]:
+    """Return the cached column values of the user with this ID, or None on a miss; do not modify them"""
+    with _lock:
+        return _by_id.get(user_id)
+
+
+def get_by_email(db: Session, email: str) -> Optional[UserDB]:
+    """Return the cached user with this email, or None on a miss"""
+    with _lock:
+        row = _by_email.get(email)
+    return _attach(db, row) if row else None
+
+
+def put(user: UserDB) -> Dict[str, Any]:
+    """Cache a user's column values under both its ID and email, and return them"""
+    row = {key: getattr(user, key) for key in _COLUMN_KEYS}
+    with _lock:
+        _by_id[user.id] = row
+        _by_email[user.email] = row
+    return row
+
+
+def invalidate(user: UserDB):
+    """Drop any cached entries for a user"""
+    invalidate_id(user.id, user.email)
+
+
+def invalidate_id(user_id: str, email: Optional[str] = None):
+    """Drop any cached entries for a user ID and, if given, an email"""
+    with _lock:
+        row = _by_id.pop(user_id, None)
+        if email:
+            _by_email.pop(email, None)
+        # The cached email may differ if it was changed before invalidating
+        if row:
+            _by_email.pop(row["email"], None)
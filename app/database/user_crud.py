@@ -1,45 +1,222 @@
-from sqlalchemy.orm import Session
-from werkzeug.security import generate_password_hash, check_password_hash
-import uuid
-from sqlalchemy import and_
+from sqlalchemy.orm import Session, defer, object_session
+from werkzeug.security import check_password_hash
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from sqlalchemy import and_, bindparam, delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from datetime import datetime
+import asyncio
+import hmac
 import logging
+import os
+from threading import Lock
 from typing import Optional, Union, Dict, Any
 
 from sqlalchemy.orm import Session
 from .database import UserDB
+from app.database import config_index, user_cache
 from app.schemas.user_models import UserUpdate
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# New hashes are argon2id ("$argon2id$..."). bcrypt ("$2a$", "$2b$", "$2y$") and werkzeug
+# hashes are still accepted and replaced with argon2id on the next successful login
+ARGON2_PREFIX = "$argon2"
+BCRYPT_PREFIX = "$2"
+
+# Memory-hard: every guess costs ARGON2_MEMORY_COST KiB, which blunts GPU/ASIC cracking
+_password_hasher = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM
+)
+
+# Lookup statements are built once so SQLAlchemy's compiled cache is hit on every call
+_USER_BY_EMAIL = select(UserDB).where(UserDB.email == bindparam("email"))
+_USER_BY_GITHUB_ID = select(UserDB).where(UserDB.github_id == bindparam("github_id"))
+
+# Successful verifications from the last VERIFIED_CACHE_TTL seconds, so repeated logins
+# skip argon2. Only successes are kept, under a keyed MAC of user, stored hash and password
+VERIFIED_CACHE_SIZE = 10_000
+VERIFIED_CACHE_TTL = 60  # seconds
+_VERIFIED_KEY = os.urandom(32)
+_verified: TTLCache = TTLCache(maxsize=VERIFIED_CACHE_SIZE, ttl=VERIFIED_CACHE_TTL)
+# TTLCache is not thread safe and sync routes run in a threadpool
+_verified_lock = Lock()
+
+# argon2-cffi and bcrypt release the GIL, so threads hash in parallel without forking
+# workers from this multithreaded process. Each argon2 job already runs
+# ARGON2_PARALLELISM lanes, so this many jobs at once keep every core busy
+HASH_WORKERS = max(1, (os.cpu_count() or 1) // settings.ARGON2_PARALLELISM)
+_hash_pool: Optional[ThreadPoolExecutor] = None
+
+def _argon2_hash(password: str) -> str:
+    return _password_hasher.hash(password)
+
+def _argon2_check(password_hash: str, password: str) -> bool:
+    try:
+        return _password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def _legacy_check(password_hash: str, password: str) -> bool:
+    if password_hash.startswith(BCRYPT_PREFIX):
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+    return check_password_hash(password_hash, password)
+
+def _get_hash_pool() -> ThreadPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="password-hash")
+    return _hash_pool
+
+def shutdown_hash_pool():
+    """Stop the password hashing threads"""
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+@lru_cache(maxsize=64)
+def _cached_test_hash(password: str) -> str:
+    # Every call for the same password returns the same salt and hash, which is
+    # why this is only used when settings.TESTING is set
+    return _argon2_hash(password)
+
+def hash_password(password: str) -> str:
+    """Hash a password with argon2id at the configured cost"""
+    if settings.TESTING:
+        return _cached_test_hash(password)
+    return _argon2_hash(password)
+
+async def ahash_password(password: str) -> str:
+    """Hash a password in the hashing thread pool without blocking the event loop"""
+    if settings.TESTING:
+        return hash_password(password)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_pool(), _argon2_hash, password)
+
 def get_users(db: Session):
-    """Retrieve all users."""
-    return db.query(UserDB).all()
+    """Retrieve all users, without their credentials (loaded on access if needed)."""
+    return db.query(UserDB).options(
+        defer(UserDB.password_hash), defer(UserDB.github_access_token)
+    ).all()
 
 def get_user_by_id(db: Session, user_id: str):
     """Retrieve a user by ID."""
-    return db.query(UserDB).filter(UserDB.id == user_id).first()
+    user = user_cache.get_by_id(db, user_id)
+    if user is None:
+        user = db.get(UserDB, user_id)
+        if user:
+            user_cache.put(user)
+    return user
+
+def get_user_row(db: Session, user_id: str) -> Optional[Dict[str, Any]]:
+    """Column values of a user by ID; a cache hit builds no ORM instance. Read-only."""
+    row = user_cache.get_row(user_id)
+    if row is None:
+        user = db.get(UserDB, user_id)
+        if user is None:
+            return None
+        row = user_cache.put(user)
+    return row
 
 def get_user_by_email(db: Session, email: str) -> Optional[UserDB]:
     """Get a user by their email address"""
-    return db.query(UserDB).filter(UserDB.email == email).first()
+    user = user_cache.get_by_email(db, email)
+    if user is None:
+        user = db.execute(_USER_BY_EMAIL, {"email": email}).scalar_one_or_none()
+        if user:
+            user_cache.put(user)
+    return user
 
 def get_user_by_github_id(db: Session, github_id: str) -> Optional[UserDB]:
     """Get a user by their GitHub ID"""
-    return db.query(UserDB).filter(UserDB.github_id == github_id).first()
+    return db.execute(_USER_BY_GITHUB_ID, {"github_id": github_id}).scalar_one_or_none()
+
+def _needs_upgrade(password_hash: str) -> bool:
+    """Whether a verified hash should be replaced: legacy schemes or outdated argon2 parameters"""
+    if not password_hash.startswith(ARGON2_PREFIX):
+        return True
+    return _password_hasher.check_needs_rehash(password_hash)
+
+def _verification_key(user: UserDB, password: str) -> bytes:
+    # Keyed MAC rather than a plain hash so the cache keys cannot be brute-forced offline;
+    # including the stored hash means a password change invalidates old entries
+    return hmac.new(_VERIFIED_KEY, "\0".join((user.id, user.password_hash, password)).encode(), "sha256").digest()
+
+def _recently_verified(user: UserDB, password: str) -> bool:
+    key = _verification_key(user, password)
+    with _verified_lock:
+        return _verified.get(key, False)
+
+def _remember_verified(user: UserDB, password: str):
+    key = _verification_key(user, password)
+    with _verified_lock:
+        _verified[key] = True
 
 def verify_password(user: UserDB, password: str) -> bool:
-    """Verify a user's password"""
+    """Verify a user's password, upgrading legacy or outdated hashes to argon2id"""
+    if not user.password_hash:
+        return False
+    if _recently_verified(user, password):
+        return True
+    if user.password_hash.startswith(ARGON2_PREFIX):
+        valid = _argon2_check(user.password_hash, password)
+    else:
+        valid = _legacy_check(user.password_hash, password)
+
+    if valid:
+        if _needs_upgrade(user.password_hash):
+            _store_password_hash(user, hash_password(password))
+        _remember_verified(user, password)
+    return valid
+
+async def averify_password(user: UserDB, password: str) -> bool:
+    """Verify a user's password in the hashing thread pool without blocking the event loop"""
     if not user.password_hash:
         return False
-    return check_password_hash(user.password_hash, password)
+    if _recently_verified(user, password):
+        return True
+    check = _argon2_check if user.password_hash.startswith(ARGON2_PREFIX) else _legacy_check
+    loop = asyncio.get_running_loop()
+    valid = await loop.run_in_executor(_get_hash_pool(), check, user.password_hash, password)
+
+    if valid:
+        if _needs_upgrade(user.password_hash):
+            # Rehash in the pool too; only the store goes through the user's session here
+            _store_password_hash(user, await ahash_password(password))
+        _remember_verified(user, password)
+    return valid
 
-def create_user(db: Session, user_data: Union[Dict[str, Any], tuple[str, str, Optional[str]], Any]) -> Optional[UserDB]:
+def _store_password_hash(user: UserDB, password_hash: str):
+    """Replace a verified legacy or outdated hash with a new argon2id hash"""
+    db = object_session(user)
+    if db is None:
+        return
+    try:
+        user.password_hash = password_hash
+        db.commit()
+        user_cache.invalidate(user)
+        logger.info(f"Upgraded password hash for user {user.id} to argon2id")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error upgrading password hash for user {user.id}: {str(e)}")
+
+def create_user(db: Session, user_data: Union[Dict[str, Any], tuple[str, str, Optional[str]], Any],
+                password_hash: Optional[str] = None) -> Optional[UserDB]:
     """Create a new user.
     
     Args:
         db: Database session
         user_data: Either a dict, a tuple of (username, email, password), or a Pydantic model
+        password_hash: Precomputed hash of the password (e.g. from ahash_password), skipping hashing here
     """
     # Convert input to dict if necessary
     if isinstance(user_data, tuple):
@@ -57,35 +234,38 @@ def create_user(db: Session, user_data: Union[Dict[str, Any], tuple[str, str, Op
         email_value = user_data.email
         password_value = getattr(user_data, "password", "")
 
-    # Check if user already exists
-    existing_user = db.query(UserDB).filter(
-        (UserDB.username == username_value) | (UserDB.email == email_value)
-    ).first()
-    
-    if existing_user:
-        # Update the existing user's information if needed
-        if password_value:
-            existing_user.password_hash = generate_password_hash(password_value)
-        db.commit()
-        return existing_user
+    if password_hash is None and password_value:
+        password_hash = hash_password(password_value)
 
-    # Create new user
-    new_user = UserDB(
-        id=str(uuid.uuid4()),
+    # One atomic statement: insert, or update the password of the user holding this username
+    stmt = sqlite_insert(UserDB).values(
         username=username_value,
         email=email_value,
-        password_hash=generate_password_hash(password_value) if password_value else None
+        password_hash=password_hash
     )
-    
-    db.add(new_user)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserDB.username],
+        set_={"password_hash": func.coalesce(stmt.excluded.password_hash, UserDB.password_hash)}
+    ).returning(UserDB)
+    try:
+        # populate_existing so an already-loaded instance picks up the new hash
+        user = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+    except IntegrityError:
+        # The email belongs to a user with a different username
+        db.rollback()
+        user = db.execute(_USER_BY_EMAIL, {"email": email_value}).scalar_one_or_none()
+        if user and password_hash:
+            user.password_hash = password_hash
+
     db.commit()
-    db.refresh(new_user)
-    logger.info(f"Created new user: {new_user.username}")
-    return new_user
+    if user:
+        user_cache.invalidate(user)
+        logger.info(f"Created or updated user: {user.username}")
+    return user
 
 def update_user(db: Session, user_id: str, user_data: UserUpdate):
     """Update user details."""
-    user = db.query(UserDB).filter(UserDB.id == user_id).first()
+    user = db.get(UserDB, user_id)
     if not user:
         return None
     
@@ -94,10 +274,10 @@ def update_user(db: Session, user_id: str, user_data: UserUpdate):
     if user_data.email:
         user.email = user_data.email
     if user_data.password:
-        user.password_hash = generate_password_hash(user_data.password)
+        user.password_hash = hash_password(user_data.password)
     
     db.commit()
-    db.refresh(user)
+    user_cache.invalidate(user)
     return user
 
 def link_github_account(db: Session, user_id: str, github_data: Dict[str, Any]) -> Optional[UserDB]:
@@ -108,7 +288,7 @@ def link_github_account(db: Session, user_id: str, github_data: Dict[str, Any])
         user_id: User ID to link with
         github_data: GitHub user data including github_id, username, etc.
     """
-    user = db.query(UserDB).filter(UserDB.id == user_id).first()
+    user = db.get(UserDB, user_id)
     if not user:
         return None
     
@@ -119,7 +299,7 @@ def link_github_account(db: Session, user_id: str, github_data: Dict[str, Any])
     user.github_avatar_url = github_data.get("avatar_url")
     
     db.commit()
-    db.refresh(user)
+    user_cache.invalidate(user)
     logger.info(f"Linked GitHub account {github_data.get('login')} to user {user.username}")
     return user
 
@@ -142,7 +322,7 @@ def create_or_update_github_user(db: Session, github_data: Dict[str, Any]) -> Us
             existing_user.github_username = github_data.get("login")
         
         db.commit()
-        db.refresh(existing_user)
+        user_cache.invalidate(existing_user)
         return existing_user
     
     # Check if user exists with the same email
@@ -154,7 +334,6 @@ def create_or_update_github_user(db: Session, github_data: Dict[str, Any]) -> Us
     
     # Create new user with GitHub data
     new_user = UserDB(
-        id=str(uuid.uuid4()),
         username=github_data.get("login"),
         email=email,
         github_id=github_id,
@@ -165,18 +344,22 @@ def create_or_update_github_user(db: Session, github_data: Dict[str, Any]) -> Us
     
     db.add(new_user)
     db.commit()
-    db.refresh(new_user)
     logger.info(f"Created new user from GitHub: {new_user.username}")
     return new_user
 
 def delete_user(db: Session, user_id: str):
     """Delete a user."""
-    user = db.query(UserDB).filter(UserDB.id == user_id).first()
-    if not user:
+    # A single DELETE; the database cascades to the user's webhooks, configs and deployments
+    email = db.execute(
+        delete(UserDB).where(UserDB.id == user_id).returning(UserDB.email)
+    ).scalar_one_or_none()
+    if email is None:
         return None
 
-    db.delete(user)
     db.commit()
+    user_cache.invalidate_id(user_id, email)
+    # The user's deployment configs went with them
+    config_index.invalidate()
     return True
 
 
@@ -1,105 +1,147 @@
+from sqlalchemy import bindparam, delete, select, tuple_
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.orm.session import make_transient_to_detached
+from threading import Lock
+from datetime import datetime
+from typing import Dict, List, Optional
 import logging
 
-from .database import (RegisteredWebhookDB,EventDB,get_utc_now,WebhookPayloadDB)
-from app.schemas.models import WebhookPayload
+from .database import (RegisteredWebhookDB,EventDB,get_utc_now,WebhookPayloadDB,payload_repository_name,timestamp_key,webhook_synced_key)
+from app.database import payload_writer
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Database CRUD operations
-def create_webhook(db_session: Session, repository: str, hook_id: str, hook_url: str, events: List[str]) -> RegisteredWebhookDB:
-    """Create a new webhook registration"""
-    webhook = RegisteredWebhookDB(
-        repository=repository,
-        hook_id=hook_id,
-        hook_url=hook_url
-    )
-    
-    # Add events
-    for event_name in events:
-        event = db_session.query(EventDB).filter_by(name=event_name).first()
-        if not event:
-            event = EventDB(name=event_name)
-            db_session.add(event)
-        
-        # Clear existing events first
-        webhook.events = []
-        webhook.events.append(event)
-    
-    db_session.add(webhook)
-    db_session.commit()
-    return webhook
-
-def log_webhook_payload(db_session: Session, webhook_id: str, payload: WebhookPayload) -> WebhookPayloadDB:
-    """Log a received webhook payload"""
-    payload_db = WebhookPayloadDB(
-        webhook_id=webhook_id,
-        repository=payload.repository,
-        pusher=payload.pusher,
-        ref=payload.ref
-    )
-    
-    db_session.add(payload_db)
-    db_session.commit()
-    return payload_db
+# Built once so SQLAlchemy's compiled cache is hit on every webhook delivery
+_WEBHOOKS_BY_REPOSITORY = select(RegisteredWebhookDB).where(
+    RegisteredWebhookDB.repository == bindparam("repository")
+)
+
+# Event names come from GitHub's small, fixed vocabulary and event rows are never deleted,
+# so once a row is known to be committed it can be attached to a session without a SELECT
+_known_events: Dict[str, Optional[str]] = {}
+_known_events_lock = Lock()
+
+def _attach_event(db_session: Session, name: str, description: Optional[str]) -> EventDB:
+    """Attach a known event row to the session as a persistent instance without a SELECT"""
+    event = EventDB(name=name, description=description)
+    make_transient_to_detached(event)
+    return db_session.merge(event, load=False)
+
+def _get_or_create_events(db_session: Session, events: List[str]) -> List[EventDB]:
+    """Get EventDB rows for the given names, creating any that are missing
+
+    Known names are served from memory; unknown ones cost one INSERT and one SELECT.
+    """
+    names = list(dict.fromkeys(events))
+    if not names:
+        return []
+    with _known_events_lock:
+        missing = [name for name in names if name not in _known_events]
+
+    if missing:
+        inserted = set(db_session.scalars(
+            sqlite_insert(EventDB).values([{"name": name} for name in missing])
+            .on_conflict_do_nothing().returning(EventDB.name)
+        ))
+        found = db_session.query(EventDB).filter(EventDB.name.in_(missing)).all()
+        # Rows inserted here are only cached once a later call sees them committed
+        with _known_events_lock:
+            _known_events.update(
+                (event.name, event.description) for event in found if event.name not in inserted
+            )
+        found_by_name = {event.name: event for event in found}
+    else:
+        found_by_name = {}
+
+    return [
+        found_by_name.get(name) or _attach_event(db_session, name, _known_events[name])
+        for name in names
+    ]
 
+# Database CRUD operations
 def get_webhook_by_repository(db_session: Session, repository: str) -> List[RegisteredWebhookDB]:
     """Get all webhooks for a repository"""
-    return db_session.query(RegisteredWebhookDB).filter_by(repository=repository).all()
+    return db_session.scalars(_WEBHOOKS_BY_REPOSITORY, {"repository": repository}).all()
 
 def add_webhook_event(db_session: Session, webhook_id: str, event_type: str, payload: dict) -> bool:
-    """Add a new webhook event to the database"""
+    """Add a new webhook event to the database
+
+    The row is handed to the payload writer, which commits payloads in batches.
+    """
+    queued = payload_writer.enqueue({
+        "webhook_id": webhook_id,
+        "repository": payload.get("repository", {}),
+        "pusher": payload.get("sender", {}),
+        "ref": payload.get("ref")
+    })
+    # Every delivery passes through here; skip building the log record when INFO is off
+    if queued and logger.isEnabledFor(logging.INFO):
+        logger.info("Added webhook event: %s - %s", webhook_id, event_type)
+    return queued
+
+def _payload_page(query, limit: int, before_id: Optional[int]):
+    """Order payloads newest first and seek past the id cursor, if given
+
+    Ids are assigned in arrival order, so they order payloads like received_at
+    does while being an exact integer comparison.
+    """
+    if before_id is not None:
+        query = query.filter(WebhookPayloadDB.id < before_id)
+    return query.order_by(WebhookPayloadDB.id.desc()).limit(limit).all()
+
+def get_webhook_events(db_session: Session, limit: int = 100, before_id: Optional[int] = None):
+    """Get webhook events, newest first, with limit
+
+    Pass the id of the last event of a page as before_id to fetch the next page.
+    """
     try:
-        event = WebhookPayloadDB(
-            webhook_id=webhook_id,
-            repository=payload.get("repository", {}),
-            pusher=payload.get("sender", {}),
-            ref=payload.get("ref")
-        )
-        
-        db_session.add(event)
-        db_session.commit()
-        logger.info(f"Added webhook event: {webhook_id} - {event_type}")
-        return True
+        return _payload_page(db_session.query(WebhookPayloadDB), limit, before_id)
     except SQLAlchemyError as e:
-        db_session.rollback()
-        logger.error(f"Error adding webhook event: {str(e)}")
-        return False
+        logger.error("Error retrieving webhook events: %s", e)
+        return []
 
-def get_webhook_events(db_session: Session, limit: int = 100):
-    """Get all webhook events ordered by timestamp with limit"""
+def get_webhook_events_by_repository(db_session: Session, repository: str, limit: int = 100,
+                                     before_id: Optional[int] = None):
+    """Get webhook events filtered by repository with limit, paged like get_webhook_events"""
     try:
-        return db_session.query(WebhookPayloadDB).order_by(
-            WebhookPayloadDB.received_at.desc()
-        ).limit(limit).all()
+        # Matches repository.full_name through the ix_wp_repo_name_id expression index
+        query = db_session.query(WebhookPayloadDB).filter(payload_repository_name == repository)
+        return _payload_page(query, limit, before_id)
     except SQLAlchemyError as e:
-        logger.error(f"Error retrieving webhook events: {str(e)}")
+        logger.error("Error retrieving webhook events for %s: %s", repository, e)
         return []
 
-def get_webhook_events_by_repository(db_session: Session, repository: str, limit: int = 100):
-    """Get webhook events filtered by repository with limit"""
+def get_webhook_event_summaries(db_session: Session, limit: int = 100, before_id: Optional[int] = None):
+    """Get (id, webhook_id, ref, received_at) rows for a list view, paged like get_webhook_events
+
+    Skips the repository and pusher JSON columns, so no payload blobs are read or decoded.
+    """
     try:
-        # Using JSON filtering appropriate for SQLite
-        return db_session.query(WebhookPayloadDB).filter(
-            WebhookPayloadDB.repository.like(f'%"{repository}"%')
-        ).order_by(WebhookPayloadDB.received_at.desc()).limit(limit).all()
+        query = db_session.query(
+            WebhookPayloadDB.id, WebhookPayloadDB.webhook_id,
+            WebhookPayloadDB.ref, WebhookPayloadDB.received_at
+        )
+        return _payload_page(query, limit, before_id)
     except SQLAlchemyError as e:
-        logger.error(f"Error retrieving webhook events for {repository}: {str(e)}")
+        logger.error("Error retrieving webhook event summaries: %s", e)
         return []
 
 def clear_webhook_events(db_session: Session) -> bool:
     """Clear all webhook events (for testing purposes)"""
     try:
-        num_deleted = db_session.query(WebhookPayloadDB).delete()
+        # A single DELETE; nothing in the identity map needs to be matched against it
+        num_deleted = db_session.execute(
+            delete(WebhookPayloadDB).execution_options(synchronize_session=False)
+        ).rowcount
         db_session.commit()
-        logger.info(f"Cleared {num_deleted} webhook events from database")
+        logger.info("Cleared %d webhook events from database", num_deleted)
         return True
     except SQLAlchemyError as e:
         db_session.rollback()
-        logger.error(f"Error clearing webhook events: {str(e)}")
+        logger.error("Error clearing webhook events: %s", e)
         return False
 
 def add_or_update_registered_webhook(db_session: Session, repository: str, hook_id: str, hook_url: str, events: List[str]) -> bool:
@@ -111,9 +153,6 @@ def add_or_update_registered_webhook(db_session: Session, repository: str, hook_
             webhook.repository = repository
             webhook.hook_url = hook_url
             webhook.last_synced = get_utc_now()
-            
-            # Clear existing events
-            webhook.events = []
         else:
             webhook = RegisteredWebhookDB(
                 repository=repository,
@@ -122,60 +161,75 @@ def add_or_update_registered_webhook(db_session: Session, repository: str, hook_
             )
             db_session.add(webhook)
 
-        # Add events
-        for event_name in events:
-            event = db_session.query(EventDB).filter_by(name=event_name).first()
-            if not event:
-                event = EventDB(name=event_name)
-                db_session.add(event)
-            webhook.events.append(event)
+        # Replace events
+        webhook.events = _get_or_create_events(db_session, events)
 
         db_session.commit()
         action = "updated" if webhook.id else "added"
-        logger.info(f"Webhook {action} for repository: {repository} (hook_id: {hook_id})")
+        logger.info("Webhook %s for repository: %s (hook_id: %s)", action, repository, hook_id)
         return True
     except SQLAlchemyError as e:
         db_session.rollback()
-        logger.error(f"Error adding/updating webhook: {str(e)}")
+        logger.error("Error adding/updating webhook: %s", e)
         return False
 
-def get_registered_webhooks(db_session: Session, limit: int = 100):
-    """Get all registered webhooks ordered by last sync time with limit"""
+def _webhook_page(query, limit: Optional[int], before: Optional[datetime], before_id: Optional[str]):
+    """Order webhooks newest-synced first and seek past the (last_synced, id) cursor, if given"""
+    if (before is None) != (before_id is None):
+        raise ValueError("before and before_id must be given together")
+    if before is not None:
+        # The cursor is normalised with the same expression as the column
+        query = query.filter(
+            tuple_(webhook_synced_key, RegisteredWebhookDB.id)
+            < tuple_(timestamp_key(before), before_id)
+        )
+    query = query.order_by(webhook_synced_key.desc(), RegisteredWebhookDB.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def get_registered_webhooks(db_session: Session, limit: int = 100,
+                            before: Optional[datetime] = None, before_id: Optional[str] = None):
+    """Get registered webhooks ordered by last sync time with limit
+
+    Pass the last_synced and id of the last webhook of a page as before/before_id
+    to fetch the next page; the two must be given together.
+    """
     try:
-        return db_session.query(RegisteredWebhookDB).order_by(
-            RegisteredWebhookDB.last_synced.desc()
-        ).limit(limit).all()
+        return _webhook_page(db_session.query(RegisteredWebhookDB), limit, before, before_id)
     except SQLAlchemyError as e:
-        logger.error(f"Error retrieving webhooks: {str(e)}")
+        logger.error("Error retrieving webhooks: %s", e)
         return []
 
-def get_registered_webhooks_by_repository(db_session: Session, repository: str):
-    """Get registered webhooks filtered by repository"""
+def get_registered_webhooks_by_repository(db_session: Session, repository: str, limit: Optional[int] = None,
+                                          before: Optional[datetime] = None, before_id: Optional[str] = None):
+    """Get registered webhooks filtered by repository, paged like get_registered_webhooks"""
     try:
-        return db_session.query(RegisteredWebhookDB).filter_by(
-            repository=repository
-        ).order_by(RegisteredWebhookDB.last_synced.desc()).all()
+        query = db_session.query(RegisteredWebhookDB).filter_by(repository=repository)
+        return _webhook_page(query, limit, before, before_id)
     except SQLAlchemyError as e:
-        logger.error(f"Error retrieving webhooks for {repository}: {str(e)}")
+        logger.error("Error retrieving webhooks for %s: %s", repository, e)
         return []
 
 def delete_registered_webhook(db_session: Session, repository: str, hook_id: str) -> bool:
     """Delete a registered webhook"""
     try:
-        webhook = db_session.query(RegisteredWebhookDB).filter(
-            RegisteredWebhookDB.repository == repository,
-            RegisteredWebhookDB.hook_id == hook_id
-        ).first()
+        # A single DELETE; the database cascades to the webhook's payloads and event links
+        num_deleted = db_session.execute(
+            delete(RegisteredWebhookDB).where(
+                RegisteredWebhookDB.repository == repository,
+                RegisteredWebhookDB.hook_id == hook_id
+            ).execution_options(synchronize_session=False)
+        ).rowcount
         
-        if webhook:
-            db_session.delete(webhook)
+        if num_deleted:
             db_session.commit()
-            logger.info(f"Deleted webhook for {repository} (hook_id: {hook_id})")
+            logger.info("Deleted webhook for %s (hook_id: %s)", repository, hook_id)
             return True
         else:
-            logger.warning(f"No webhook found for {repository} (hook_id: {hook_id})")
+            logger.warning("No webhook found for %s (hook_id: %s)", repository, hook_id)
             return False
     except SQLAlchemyError as e:
         db_session.rollback()
-        logger.error(f"Error deleting webhook: {str(e)}")
+        logger.error("Error deleting webhook: %s", e)
         return False
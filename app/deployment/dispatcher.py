@@ -0,0 +1,83 @@
+"""
+Background dispatch of webhook events to the deployment engine.
+
+The webhook route only validates and queues push events so GitHub gets its
+response without waiting on config lookups or deployment records. A single
+task consumes the queue, creates the deployment records on a worker thread
+and starts the deployments on the event loop.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from app.database.database import SessionLocal
+from app.deployment.engine import create_webhook_deployment, schedule_deployment
+from app.schemas.models import PushEvent
+
+logger = logging.getLogger(__name__)
+
+# Beyond this backlog the webhook route answers 503 and GitHub redelivers later
+MAX_QUEUED = 1024
+
+# Created on startup so it is bound to the running event loop
+queue: Optional[asyncio.Queue] = None
+_worker_task: Optional[asyncio.Task] = None
+
+
+def enqueue(event: PushEvent) -> bool:
+    """Queue a push event for dispatch; False if the queue is full or not running"""
+    if queue is None:
+        return False
+    try:
+        queue.put_nowait(event)
+        return True
+    except asyncio.QueueFull:
+        return False
+
+
+def _create_deployment(event: PushEvent) -> Optional[str]:
+    """Create the deployment a push event calls for, with a session of its own; runs on a worker thread"""
+    with SessionLocal() as db:
+        return create_webhook_deployment(db, event)
+
+
+async def dispatch(event: PushEvent):
+    """Start the deployment a push event calls for"""
+    deployment_id = await asyncio.to_thread(_create_deployment, event)
+    if deployment_id:
+        schedule_deployment(deployment_id)
+        logger.info(f"Triggered deployment {deployment_id} for {event.repo_full_name}")
+
+
+async def worker():
+    """Dispatch queued push events one at a time"""
+    while True:
+        event = await queue.get()
+        try:
+            await dispatch(event)
+        except Exception as e:
+            logger.error(f"Error dispatching push event for {event.repo_full_name}: {str(e)}")
+
+
+def start():
+    """Create the queue and start the dispatch task on the running loop"""
+    global queue, _worker_task
+    queue = asyncio.Queue(maxsize=MAX_QUEUED)
+    _worker_task = asyncio.create_task(worker())
+
+
+async def stop():
+    """Stop the dispatch task; events still queued are dropped"""
+    global queue, _worker_task
+    if _worker_task:
+        _worker_task.cancel()
+        try:
+            await _worker_task
+        except asyncio.CancelledError:
+            pass
+        _worker_task = None
+
+    if queue is not None:
+        if not queue.empty():
+            logger.warning(f"Dropping {queue.qsize()} undispatched webhook events on shutdown")
+        queue = None
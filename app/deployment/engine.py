@@ -1,63 +1,177 @@
+import asyncio
+import errno
+import fcntl
+import io
 import os
-import subprocess
+import tarfile
 import tempfile
-import threading
 import logging
-import time
+import shlex
 import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional, Dict, Any, Tuple, Callable
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Dict, Any, Set, Tuple, Callable, Union
 import uuid
 import json
+import httpx
 
 from sqlalchemy.orm import Session, sessionmaker
-from app.database.database import DeploymentStatus, DeploymentEnvironment, get_db, SessionLocal
+from app.database.config_index import get_auto_deploy_user_ids
+from app.database.database import (
+    DeploymentConfigDB,
+    DeploymentDB,
+    DeploymentEnvironment,
+    DeploymentStatus,
+    SessionLocal,
+    get_db
+)
 from app.database.deployment_crud import (
     get_deployment,
     update_deployment_status,
-    add_deployment_log,
     get_deployment_config
 )
+from app.database.deployment_logs import append_deployment_log, append_deployment_logs, index_deployment_log
 from app.schemas.deployment_models import DeploymentRequest, DeploymentResult
+from app.schemas.models import PushEvent
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
-# Deployment cache to track running deployments
-active_deployments = {}
+# Deployment cache to track running deployments. Only touched from the event loop,
+# which runs every deployment task and route, so no locking is needed
+active_deployments: Dict[str, Dict[str, Any]] = {}
 
-def get_thread_db():
-    """Get a new database session for the current thread"""
-    db = SessionLocal()
-    try:
-        return db
-    finally:
-        db.close()
+# Snapshot of a single commit, without any git metadata
+CODELOAD_URL = "https://codeload.github.com/{repo}/tar.gz/{sha}"
 
+# Created on first download; reused across deployments
+_http_client: Optional[httpx.Client] = None
 
-def run_command(command: str, cwd: str, env: Dict[str, str], deployment_id: Optional[str] = None, db: Optional[Session] = None) -> Tuple[int, str, str]:
-    """Run a shell command and return exit code, stdout, and stderr"""
-    logger.info(f"Running command: {command}")
-    
-    process = subprocess.Popen(
-        command,
-        shell=True,
+# Bounds how many deployments run at once; created on first use so it binds to the app's loop
+_deploy_slots: Optional[asyncio.Semaphore] = None
+_deployment_tasks: Set[asyncio.Task] = set()
+
+# Longest output line read from a deploy command before the stream reader gives up
+STREAM_LINE_LIMIT = 1024 * 1024
+
+# Host variables deploy commands inherit; everything else (including this service's
+# own secrets) stays out of their environment. Snapshotted once at import
+_DEPLOY_ENV_ALLOWLIST = frozenset({
+    "PATH", "HOME", "USER", "LANG", "LC_ALL", "TZ", "TMPDIR", "SSH_AUTH_SOCK"
+})
+_BASE_ENV: Dict[str, str] = {
+    key: value for key, value in os.environ.items()
+    if key in _DEPLOY_ENV_ALLOWLIST or key.startswith("DEPLOY_")
+}
+
+# git keeps the full host environment (proxies, CA bundles, GIT_* settings) but must
+# never wait on a credential prompt
+_GIT_ENV: Dict[str, str] = os.environ | {"GIT_TERMINAL_PROMPT": "0"}
+
+# Finished deployment directories are renamed into here and deleted by one background thread
+TRASH_DIR = os.path.join(tempfile.gettempdir(), ".quark_trash")
+_trash_pool: Optional[ThreadPoolExecutor] = None
+
+# How long a finished deployment stays in active_deployments
+ACTIVE_DEPLOYMENT_TTL = 3600  # seconds
+
+# (expiry loop time, deployment_id) of finished deployments. Every entry gets the same
+# TTL, so appending keeps it sorted and one reaper task only ever looks at the head
+_expiring: deque = deque()
+_reaper_task: Optional[asyncio.Task] = None
+
+class LogBuffer:
+    """Collects a deployment's output lines and writes them in batches
+
+    Lines are flushed in one append to the deployment's log file once max_lines are buffered,
+    or max_interval seconds after the first unflushed line, whichever comes first.
+    Used from the event loop by run_command's stream readers.
+    """
+
+    def __init__(self, deployment_id: str, max_lines: int = 64, max_interval: float = 0.25):
+        self.deployment_id = deployment_id
+        self.max_lines = max_lines
+        self.max_interval = max_interval
+        self._lines = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def append(self, line: str):
+        self._lines.append(line)
+        if len(self._lines) >= self.max_lines:
+            self.flush()
+        elif self._timer is None:
+            # Bound how long a line can wait when output is sparse
+            self._timer = asyncio.get_running_loop().call_later(self.max_interval, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._lines:
+            lines = list(self._lines)
+            self._lines.clear()
+            append_deployment_logs(self.deployment_id, lines)
+
+
+# Commands using any of these need /bin/sh; anything else is exec'd directly
+_SHELL_CHARS = frozenset("|&;<>()$`\\\"'*?[]#~={}!\n")
+
+
+def _command_argv(command: str) -> List[str]:
+    """Split a command into argv, going through /bin/sh only when it uses shell syntax"""
+    if _SHELL_CHARS.intersection(command):
+        return ["/bin/sh", "-c", command]
+    return shlex.split(command)
+
+
+@lru_cache(maxsize=64)
+def _which(program: str, path: Optional[str]) -> Optional[str]:
+    return shutil.which(program, path=path)
+
+
+async def _spawn(argv: List[str], cwd: str, env: Dict[str, str]) -> asyncio.subprocess.Process:
+    # Exec by absolute path, so the child makes one execve instead of trying every PATH entry.
+    # No preexec_fn or session/user changes either: those would rule out vfork (Python 3.10+)
+    program = argv[0]
+    if os.sep not in program:
+        program = _which(program, env.get("PATH")) or program
+    return await asyncio.create_subprocess_exec(
+        program, *argv[1:],
         cwd=cwd,
         env=env,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
-        universal_newlines=True
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=STREAM_LINE_LIMIT
     )
+
+
+async def run_command(command: Union[str, List[str]], cwd: str, env: Dict[str, str],
+                      deployment_id: Optional[str] = None) -> Tuple[int, str, str]:
+    """Run a command (a command line or an argv list) and return exit code, stdout, and stderr"""
+    argv = command if isinstance(command, list) else _command_argv(command)
+    logger.info(f"Running command: {shlex.join(argv)}")
+    
+    try:
+        process = await _spawn(argv, cwd, env)
+    except OSError as e:
+        if e.errno != errno.ENOEXEC:
+            raise
+        # A script without a shebang line: run it with sh, as the shell itself would
+        process = await _spawn(["/bin/sh", *argv], cwd, env)
     
     stdout_lines = []
     stderr_lines = []
+    log_buffer = LogBuffer(deployment_id) if deployment_id else None
     
-    def read_stream(stream, lines, stream_name, is_error=False):
-        for line in iter(stream.readline, ''):
+    async def read_stream(stream, lines, stream_name, is_error=False):
+        async for raw_line in stream:
+            line = raw_line.decode(errors="replace")
             stripped_line = line.strip()
             lines.append(line)
-            if deployment_id and db:
+            if log_buffer:
                 # Add log with prefix and appropriate color coding
                 log_prefix = f"[{stream_name}]"
                 if is_error:
@@ -68,65 +182,297 @@ def run_command(command: str, cwd: str, env: Dict[str, str], deployment_id: Opti
                          log_line = f"{log_prefix} \033[0;31m{stripped_line}\033[0m" # Red for errors
                 else:
                     log_line = f"{log_prefix} {stripped_line}"
-                add_deployment_log(db, deployment_id, log_line)
-    
-    # Create threads to read stdout and stderr
-    stdout_thread = threading.Thread(target=read_stream, args=(process.stdout, stdout_lines, "stdout"))
-    stderr_thread = threading.Thread(target=read_stream, args=(process.stderr, stderr_lines, "stderr", True))
-    
-    # Start threads
-    stdout_thread.start()
-    stderr_thread.start()
+                log_buffer.append(log_line)
     
-    # Wait for process to complete
-    process.wait()
+    # Drain both pipes concurrently on the event loop, then reap the process
+    await asyncio.gather(
+        read_stream(process.stdout, stdout_lines, "stdout"),
+        read_stream(process.stderr, stderr_lines, "stderr", True)
+    )
+    await process.wait()
     
-    # Wait for output threads to complete
-    stdout_thread.join()
-    stderr_thread.join()
+    # Write whatever is still buffered before the caller logs its next step
+    if log_buffer:
+        log_buffer.flush()
     
     return process.returncode, ''.join(stdout_lines), ''.join(stderr_lines)
 
 
-def prepare_deployment_directory(repo_url: str, branch: str, commit_sha: str) -> str:
-    """Clone the repository and checkout the specific commit"""
+def _mirror_path(repo_full_name: str) -> str:
+    """Location of the cached bare clone of a repository"""
+    owner, _, repo = repo_full_name.partition("/")
+    return os.path.join(settings.REPO_CACHE_DIR, f"{owner}__{repo}.git")
+
+
+async def _git(args: List[str], cwd: str, env: Dict[str, str]) -> Tuple[int, str, str]:
+    return await run_command(["git", "-c", "protocol.version=2", *args], cwd, env)
+
+
+async def _has_commit(mirror: str, commit_sha: str, env: Dict[str, str]) -> bool:
+    code, _, _ = await _git(["cat-file", "-e", f"{commit_sha}^{{commit}}"], mirror, env)
+    return code == 0
+
+
+async def _update_mirror(repo_url: str, branch: str, commit_sha: str, mirror: str, env: Dict[str, str]):
+    """Create the bare partial clone if missing, then fetch the commit unless it is already cached"""
+    if not os.path.isdir(mirror):
+        # Clone beside the cache entry and rename, so an interrupted clone is never mistaken for one
+        partial = f"{mirror}.partial"
+        await asyncio.to_thread(shutil.rmtree, partial, ignore_errors=True)
+        # Blobless: history and trees only; file contents are fetched when a worktree needs them
+        code, _, stderr = await _git(
+            ["clone", "--bare", "--filter=blob:none", "--no-tags", repo_url, partial],
+            settings.REPO_CACHE_DIR, env
+        )
+        if code != 0:
+            raise Exception(f"Failed to clone repository: {stderr}")
+        os.rename(partial, mirror)
+
+    if await _has_commit(mirror, commit_sha, env):
+        return
+
+    code, _, stderr = await _git(["fetch", "--filter=blob:none", "--no-tags", "origin", commit_sha], mirror, env)
+    if code != 0:
+        # A server that refuses fetching by SHA still serves the branch, which should contain it
+        code, _, stderr = await _git(
+            ["fetch", "--filter=blob:none", "--no-tags", "origin", f"+refs/heads/{branch}:refs/heads/{branch}"],
+            mirror, env
+        )
+    if code != 0:
+        raise Exception(f"Failed to fetch commit {commit_sha}: {stderr}")
+    if not await _has_commit(mirror, commit_sha, env):
+        raise Exception(f"Commit {commit_sha} not found on branch {branch}")
+
+
+async def checkout_commit(repo_full_name: str, branch: str, commit_sha: str, deploy_dir: str):
+    """Check out the requested commit into deploy_dir as a worktree of the cached repository
+
+    The first deploy of a repository makes a blobless bare clone; later deploys only
+    fetch commits the cache lacks. A per-repository file lock serializes fetches and
+    worktree changes, across processes too.
+    """
+    env = _GIT_ENV
+    repo_url = f"https://github.com/{repo_full_name}.git"
+    mirror = _mirror_path(repo_full_name)
+    os.makedirs(settings.REPO_CACHE_DIR, exist_ok=True)
+
+    lock_file = open(f"{mirror}.lock", "w")
+    try:
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        await _update_mirror(repo_url, branch, commit_sha, mirror, env)
+        # Forget worktrees whose directories earlier cleanups deleted
+        await _git(["worktree", "prune"], mirror, env)
+        code, _, stderr = await _git(["worktree", "add", "--detach", deploy_dir, commit_sha], mirror, env)
+        if code != 0:
+            raise Exception(f"Failed to checkout commit {commit_sha}: {stderr}")
+    finally:
+        # Closing the file releases the lock
+        lock_file.close()
+
+
+class _ResponseReader(io.RawIOBase):
+    """Minimal read-only file object over a streamed httpx response, for tarfile's stream mode"""
+
+    def __init__(self, response: httpx.Response):
+        self._chunks = response.iter_bytes()
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def _get_http_client() -> httpx.Client:
+    """Shared client so repeated deploys reuse the HTTP/2 connection to GitHub"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(http2=True, timeout=httpx.Timeout(30.0, read=300.0))
+    return _http_client
+
+
+def close_http_client():
+    """Close the shared archive download client"""
+    global _http_client
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+
+
+def download_commit_snapshot(repo_full_name: str, commit_sha: str, deploy_dir: str, token: Optional[str] = None):
+    """Stream the tree of a single commit from GitHub's tarball endpoint into deploy_dir"""
+    url = CODELOAD_URL.format(repo=repo_full_name, sha=commit_sha)
+    headers = {"Authorization": f"token {token}"} if token else {}
+    with _get_http_client().stream("GET", url, headers=headers) as response:
+        response.raise_for_status()
+        with tarfile.open(fileobj=_ResponseReader(response), mode="r|gz") as tar:
+            for member in tar:
+                # The archive wraps the tree in a single "<repo>-<sha>/" directory
+                _, _, name = member.name.partition("/")
+                if not name:
+                    continue
+                member.name = name
+                tar.extract(member, deploy_dir, filter="data")
+
+
+def _uses_git_lfs(deploy_dir: str) -> bool:
+    """Whether the tree has LFS pointers, which an archive download leaves unresolved"""
+    try:
+        with open(os.path.join(deploy_dir, ".gitattributes")) as f:
+            return "filter=lfs" in f.read()
+    except OSError:
+        return False
+
+
+async def prepare_deployment_directory(repo_full_name: str, branch: str, commit_sha: str,
+                                 token: Optional[str] = None) -> str:
+    """Put the files of the requested commit into a new deployment directory
+
+    Downloads the commit's tarball, which needs no git process and no history.
+    Falls back to a worktree of the cached git repository if the download fails or the repository uses LFS.
+    """
     deploy_dir = os.path.join(tempfile.gettempdir(), f"deploy_{uuid.uuid4().hex}")
     os.makedirs(deploy_dir, exist_ok=True)
     
-    # Clone the repository
-    clone_cmd = f"git clone {repo_url} {deploy_dir}"
-    code, stdout, stderr = run_command(clone_cmd, "/tmp", os.environ.copy())
-    if code != 0:
-        raise Exception(f"Failed to clone repository: {stderr}")
-    
-    # Checkout the specific commit
-    checkout_cmd = f"git checkout {commit_sha}"
-    code, stdout, stderr = run_command(checkout_cmd, deploy_dir, os.environ.copy())
-    if code != 0:
-        raise Exception(f"Failed to checkout commit {commit_sha}: {stderr}")
+    try:
+        await asyncio.to_thread(download_commit_snapshot, repo_full_name, commit_sha, deploy_dir, token)
+        if not _uses_git_lfs(deploy_dir):
+            return deploy_dir
+        logger.info(f"{repo_full_name} uses Git LFS, fetching with git instead")
+    except Exception as e:
+        logger.warning(f"Archive download of {repo_full_name}@{commit_sha} failed, fetching with git: {str(e)}")
     
+    # Start the git path from an empty directory
+    await asyncio.to_thread(shutil.rmtree, deploy_dir, ignore_errors=True)
+    os.makedirs(deploy_dir, exist_ok=True)
+    await checkout_commit(repo_full_name, branch, commit_sha, deploy_dir)
     return deploy_dir
 
 
-def cleanup_deployment_directory(deploy_dir: str):
-    """Clean up the deployment directory"""
+def _remove_tree(path: str):
     try:
-        if os.path.exists(deploy_dir):
-            shutil.rmtree(deploy_dir)
+        shutil.rmtree(path)
     except Exception as e:
-        logger.error(f"Failed to clean up deployment directory {deploy_dir}: {str(e)}")
+        logger.error(f"Failed to delete {path}: {str(e)}")
+
+
+def _get_trash_pool() -> ThreadPoolExecutor:
+    """Single background thread that deletes trashed deployment directories"""
+    global _trash_pool
+    if _trash_pool is None:
+        _trash_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deploy-trash")
+        # Leftovers from a previous run that stopped before deleting them
+        if os.path.isdir(TRASH_DIR):
+            for name in os.listdir(TRASH_DIR):
+                _trash_pool.submit(_remove_tree, os.path.join(TRASH_DIR, name))
+    return _trash_pool
+
 
+def shutdown_trash_pool():
+    """Stop the background deleter; anything still in TRASH_DIR is deleted on the next start"""
+    global _trash_pool
+    if _trash_pool is not None:
+        _trash_pool.shutdown(wait=False, cancel_futures=True)
+        _trash_pool = None
 
-def execute_deployment(deployment_id: str, callback: Optional[Callable] = None):
-    """Execute a deployment asynchronously"""
-    # Create a new database session for this thread
-    db = get_thread_db()
+
+def cleanup_deployment_directory(deploy_dir: str):
+    """Move the deployment directory into TRASH_DIR and delete it in the background
+
+    The rename is a single metadata operation on the same filesystem, so the
+    deployment (and its concurrency slot) does not wait on a recursive delete.
+    """
+    # Started first, so its sweep of leftovers cannot pick up this directory as well
+    trash_pool = _get_trash_pool()
+    trash_path = os.path.join(TRASH_DIR, uuid.uuid4().hex)
     try:
-        # Mark deployment as in progress
+        os.makedirs(TRASH_DIR, exist_ok=True)
+        os.rename(deploy_dir, trash_path)
+    except FileNotFoundError:
+        return
+    except OSError as e:
+        # e.g. TRASH_DIR on another filesystem: delete in place, still off the deployment's path
+        logger.warning(f"Could not move {deploy_dir} to the trash, deleting in place: {str(e)}")
+        trash_path = deploy_dir
+    trash_pool.submit(_remove_tree, trash_path)
+
+
+def _set_active_status(deployment_id: str, status: DeploymentStatus):
+    """Update a tracked deployment's status; a no-op once its entry has expired"""
+    entry = active_deployments.get(deployment_id)
+    if entry is not None:
+        entry["status"] = status.value
+
+
+def _begin_deployment(deployment_id: str) -> Optional[Tuple[DeploymentDB, Optional[DeploymentConfigDB], Optional[str]]]:
+    """Mark a deployment in progress and load its config and the owner's GitHub token
+
+    Runs on a worker thread with its own session. The rows come back detached but
+    loaded, since sessions do not expire on commit.
+    """
+    with SessionLocal() as db:
         deployment = update_deployment_status(db, deployment_id, DeploymentStatus.IN_PROGRESS)
         if not deployment:
+            return None
+        config = get_deployment_config(db, deployment.repo_full_name, deployment.user_id)
+        # The owner's GitHub token lets the archive download reach private repositories
+        token = deployment.user.github_access_token if config and deployment.user else None
+        return deployment, config, token
+
+
+def _finish_deployment(deployment_id: str, status: DeploymentStatus, error_message: Optional[str]):
+    """Record a deployment's final status and index its log file; runs on a worker thread"""
+    with SessionLocal() as db:
+        # The final status and the finished log's index row commit together
+        try:
+            update_deployment_status(db, deployment_id, status, error_message=error_message, commit=False)
+            index_deployment_log(db, deployment_id, commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+def _prepare_deploy_script(deploy_dir: str, environment_variables: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Make deploy.sh executable and write the .env file; returns an error message if there is no deploy.sh"""
+    deploy_script_path = os.path.join(deploy_dir, "deploy.sh")
+    if not os.path.exists(deploy_script_path):
+        return "deploy.sh script not found in repository"
+    os.chmod(deploy_script_path, 0o755)
+    if environment_variables:
+        # One write; values are shell-quoted so deploy.sh can source the file safely
+        env_file = "".join(
+            f"{key}={shlex.quote(str(value))}\n" for key, value in environment_variables.items()
+        )
+        Path(os.path.join(deploy_dir, ".env")).write_bytes(env_file.encode())
+    return None
+
+
+async def execute_deployment(deployment_id: str, callback: Optional[Callable] = None):
+    """Execute a deployment asynchronously
+
+    Database and filesystem work runs in worker threads, each step with its own
+    session, so the event loop only waits on the deploy command's output.
+    """
+    # Outcome, committed together with the log index in one transaction at the end
+    final_status: Optional[DeploymentStatus] = None
+    error_message: Optional[str] = None
+    try:
+        # Mark deployment as in progress
+        begun = await asyncio.to_thread(_begin_deployment, deployment_id)
+        if not begun:
             logger.error(f"Deployment {deployment_id} not found")
             return
+        deployment, config, token = begun
         
         # Track active deployment
         active_deployments[deployment_id] = {
@@ -135,101 +481,73 @@ def execute_deployment(deployment_id: str, callback: Optional[Callable] = None):
             "start_time": datetime.now().isoformat()
         }
         
-        # Get deployment config
-        config = get_deployment_config(db, deployment.repo_full_name, deployment.user_id)
         if not config:
-            error_msg = f"Deployment configuration for {deployment.repo_full_name} not found"
-            logger.error(error_msg)
-            update_deployment_status(db, deployment_id, DeploymentStatus.FAILED, 
-                                    error_message=error_msg)
-            active_deployments[deployment_id]["status"] = DeploymentStatus.FAILED.value
+            error_message = f"Deployment configuration for {deployment.repo_full_name} not found"
+            logger.error(error_message)
+            final_status = DeploymentStatus.FAILED
             return
         
-        add_deployment_log(db, deployment_id, f"Starting deployment of {deployment.repo_full_name} at commit {deployment.commit_sha}")
-        
-        # GitHub repository URL
-        repo_url = f"https://github.com/{deployment.repo_full_name}.git"
+        append_deployment_log(deployment_id, f"Starting deployment of {deployment.repo_full_name} at commit {deployment.commit_sha}")
         
         try:
-            # Prepare environment
-            env = os.environ.copy()
-            
-            # Add deployment-specific variables
-            env["DEPLOYMENT_ID"] = deployment_id
-            env["REPO_NAME"] = deployment.repo_full_name
-            env["COMMIT_SHA"] = deployment.commit_sha
-            env["BRANCH"] = deployment.branch
-            
-            # Add custom environment variables from config
+            # Prepare environment: allowlisted host variables, deployment-specific
+            # variables, then custom environment variables from config
+            env = _BASE_ENV | {
+                "DEPLOYMENT_ID": deployment_id,
+                "REPO_NAME": deployment.repo_full_name,
+                "COMMIT_SHA": deployment.commit_sha,
+                "BRANCH": deployment.branch
+            }
             if config.environment_variables:
-                add_deployment_log(db, deployment_id, "Setting environment variables from config")
-                env.update(config.environment_variables)
+                append_deployment_log(deployment_id, "Setting environment variables from config")
+                env |= config.environment_variables
             
             # Prepare deployment directory
-            add_deployment_log(db, deployment_id, "Preparing deployment directory")
-            deploy_dir = prepare_deployment_directory(repo_url, deployment.branch, deployment.commit_sha)
+            append_deployment_log(deployment_id, "Preparing deployment directory")
+            deploy_dir = await prepare_deployment_directory(
+                deployment.repo_full_name, deployment.branch, deployment.commit_sha, token
+            )
             
             try:
-                # Check if deploy script exists
-                deploy_script_path = os.path.join(deploy_dir, "deploy.sh")
-                if not os.path.exists(deploy_script_path):
-                    error_msg = "deploy.sh script not found in repository"
-                    add_deployment_log(db, deployment_id, f"Error: {error_msg}")
+                # Check the deploy script exists, make it executable and create the .env file
+                error_msg = await asyncio.to_thread(_prepare_deploy_script, deploy_dir, config.environment_variables)
+                if error_msg:
+                    append_deployment_log(deployment_id, f"Error: {error_msg}")
                     raise Exception(error_msg)
-                
-                # Make deploy script executable
-                add_deployment_log(db, deployment_id, "Setting execute permissions on deploy script")
-                os.chmod(deploy_script_path, 0o755)
-                
-                # Create .env file if environment variables are provided
+                append_deployment_log(deployment_id, "Set execute permissions on deploy script")
                 if config.environment_variables:
-                    env_file_path = os.path.join(deploy_dir, ".env")
-                    add_deployment_log(db, deployment_id, "Creating .env file")
-                    with open(env_file_path, "w") as f:
-                        for key, value in config.environment_variables.items():
-                            f.write(f"{key}={value}\n")
+                    append_deployment_log(deployment_id, "Created .env file")
                 
                 # Execute deploy command
-                add_deployment_log(db, deployment_id, f"Running: {config.deploy_command}")
-                code, stdout, stderr = run_command(config.deploy_command, deploy_dir, env, deployment_id, db)
+                append_deployment_log(deployment_id, f"Running: {config.deploy_command}")
+                code, stdout, stderr = await run_command(config.deploy_command, deploy_dir, env, deployment_id)
                 
                 if code != 0:
                     error_msg = f"Deploy command failed with exit code {code}"
                     raise Exception(error_msg)
                 
                 # Mark deployment as completed
-                add_deployment_log(db, deployment_id, "Deployment completed successfully")
-                update_deployment_status(db, deployment_id, DeploymentStatus.COMPLETED)
-                active_deployments[deployment_id]["status"] = DeploymentStatus.COMPLETED.value
+                append_deployment_log(deployment_id, "Deployment completed successfully")
+                final_status = DeploymentStatus.COMPLETED
                 
             except Exception as e:
                 # This block handles errors *during* the deployment command execution (e.g., script not found, command fails)
                 error_message = str(e)
                 logger.error(f"Deployment {deployment_id} failed during execution: {error_message}")
-                # Ensure the final error log is added before updating status
-                add_deployment_log(db, deployment_id, f"\033[0;31mDeployment failed: {error_message}\033[0m")
-                db.commit() # Commit the log immediately
-                
-                update_deployment_status(db, deployment_id, DeploymentStatus.FAILED, 
-                                       error_message=error_message)
-                active_deployments[deployment_id]["status"] = DeploymentStatus.FAILED.value
+                append_deployment_log(deployment_id, f"\033[0;31mDeployment failed: {error_message}\033[0m")
+                final_status = DeploymentStatus.FAILED
             
             finally:
                 # Clean up deployment directory regardless of success or failure inside the inner try
-                add_deployment_log(db, deployment_id, "Cleaning up deployment directory")
+                append_deployment_log(deployment_id, "Cleaning up deployment directory")
                 cleanup_deployment_directory(deploy_dir)
 
         except Exception as e:
             # This outer block handles errors *before* the deploy command runs (e.g., cloning fails, config not found)
             error_message = str(e)
             logger.error(f"Deployment {deployment_id} failed during setup: {error_message}")
-            # Ensure the final error log is added before updating status
-            add_deployment_log(db, deployment_id, f"\033[0;31mDeployment setup failed: {error_message}\033[0m")
-            db.commit() # Commit the log immediately
-            
-            update_deployment_status(db, deployment_id, DeploymentStatus.FAILED, 
-                                   error_message=error_message)
-            active_deployments[deployment_id]["status"] = DeploymentStatus.FAILED.value
+            append_deployment_log(deployment_id, f"\033[0;31mDeployment setup failed: {error_message}\033[0m")
+            final_status = DeploymentStatus.FAILED
         
         # Execute callback if provided
         if callback:
@@ -238,28 +556,71 @@ def execute_deployment(deployment_id: str, callback: Optional[Callable] = None):
     except Exception as e:
         # This handles errors even before the main try block (e.g., initial status update fails)
         logger.error(f"Critical error in deployment execution {deployment_id}: {str(e)}")
-        # We might not have a valid deployment record here, so log cautiously
-        try:
-             if deployment_id and db:
-                 update_deployment_status(db, deployment_id, DeploymentStatus.FAILED, 
-                               error_message=f"Internal error: {str(e)}")
-                 if deployment_id in active_deployments:
-                     active_deployments[deployment_id]["status"] = DeploymentStatus.FAILED.value
-        except Exception as final_err:
-             logger.error(f"Failed to even update status for deployment {deployment_id} after critical error: {final_err}")
+        final_status = DeploymentStatus.FAILED
+        error_message = f"Internal error: {str(e)}"
 
     finally:
-        # Close the database session
-        if db:
-            db.close()
+        if final_status:
+            try:
+                await asyncio.to_thread(_finish_deployment, deployment_id, final_status, error_message)
+                _set_active_status(deployment_id, final_status)
+            except Exception as final_err:
+                logger.error(f"Failed to record final status of deployment {deployment_id}: {final_err}")
         
         # Remove from active deployments after some time
-        def cleanup_active_deployment():
-            time.sleep(3600)  # Keep in active list for 1 hour
-            if deployment_id in active_deployments:
-                del active_deployments[deployment_id]
-        
-        threading.Thread(target=cleanup_active_deployment, daemon=True).start()
+        _expire_later(deployment_id)
+
+
+async def _reap_expired():
+    """Drop finished deployments from active_deployments as their TTL runs out; exits once none are left"""
+    loop = asyncio.get_running_loop()
+    while _expiring:
+        expires_at, deployment_id = _expiring[0]
+        delay = expires_at - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            continue
+        _expiring.popleft()
+        active_deployments.pop(deployment_id, None)
+
+
+def _expire_later(deployment_id: str):
+    """Schedule a finished deployment's removal from active_deployments, starting the reaper if idle"""
+    global _reaper_task
+    loop = asyncio.get_running_loop()
+    _expiring.append((loop.time() + ACTIVE_DEPLOYMENT_TTL, deployment_id))
+    if _reaper_task is None or _reaper_task.done():
+        _reaper_task = loop.create_task(_reap_expired())
+
+
+async def _run_deployment(deployment_id: str):
+    """Run a deployment once one of the DEPLOY_CONCURRENCY slots is free"""
+    global _deploy_slots
+    if _deploy_slots is None:
+        _deploy_slots = asyncio.Semaphore(settings.DEPLOY_CONCURRENCY)
+    async with _deploy_slots:
+        entry = active_deployments.get(deployment_id)
+        if entry is not None and entry["status"] == DeploymentStatus.CANCELLED.value:
+            # Cancelled while it was waiting for a slot
+            _expire_later(deployment_id)
+            return
+        await execute_deployment(deployment_id)
+
+
+def schedule_deployment(deployment_id: str):
+    """Run a created deployment as a task on the running event loop"""
+    # Tracked from the start, so status checks and log streams see a deployment
+    # that is still waiting for a slot as pending rather than finished
+    active_deployments[deployment_id] = {
+        "id": deployment_id,
+        "status": DeploymentStatus.PENDING.value,
+        "start_time": None
+    }
+    
+    task = asyncio.get_running_loop().create_task(_run_deployment(deployment_id))
+    # The loop only keeps weak references to tasks
+    _deployment_tasks.add(task)
+    task.add_done_callback(_deployment_tasks.discard)
 
 
 def start_deployment(db: Session, user_id: str, request: DeploymentRequest) -> Tuple[bool, str, Optional[str]]:
@@ -271,13 +632,8 @@ def start_deployment(db: Session, user_id: str, request: DeploymentRequest) -> T
     if not deployment:
         return False, "Failed to create deployment record", None
     
-    # Start deployment in a separate thread
-    thread = threading.Thread(
-        target=execute_deployment,
-        args=(deployment.id,),
-        daemon=True
-    )
-    thread.start()
+    # Run the deployment on the caller's event loop (callers are async routes)
+    schedule_deployment(deployment.id)
     
     return True, "Deployment started", deployment.id
 
@@ -295,74 +651,54 @@ def cancel_deployment(db: Session, deployment_id: str) -> bool:
     update_deployment_status(db, deployment_id, DeploymentStatus.CANCELLED, 
                           logs=["Deployment cancelled by user"])
     
-    if deployment_id in active_deployments:
-        active_deployments[deployment_id]["status"] = DeploymentStatus.CANCELLED.value
+    _set_active_status(deployment_id, DeploymentStatus.CANCELLED)
     
     return True
 
 
 def get_deployment_status(deployment_id: str) -> Dict[str, Any]:
     """Get current status of a deployment"""
-    if deployment_id in active_deployments:
-        return active_deployments[deployment_id]
+    entry = active_deployments.get(deployment_id)
+    if entry is not None:
+        return entry
     return {"id": deployment_id, "status": "unknown", "message": "Deployment not found in active deployments"}
 
 
-def process_webhook_event(db: Session, event_type: str, payload: Dict[str, Any]) -> Optional[str]:
-    """Process webhook event and trigger deployment if configured"""
+def create_webhook_deployment(db: Session, event: PushEvent) -> Optional[str]:
+    """Create the auto-deployment record a push event calls for and return its ID
+
+    Only touches the database, so it can run on a worker thread; the caller
+    starts the deployment with schedule_deployment on the event loop.
+    """
+    from app.database.deployment_crud import create_deployment
+    
     try:
-        # Only process push events for now
-        if event_type != "push":
-            return None
-        
-        # Extract repository and branch information
-        repo_name = payload.get("repository", {}).get("full_name")
-        ref = payload.get("ref", "")
-        
-        # Skip if not a branch push
-        if not ref.startswith("refs/heads/"):
-            return None
-        
-        branch = ref.replace("refs/heads/", "")
-        
-        # Get the latest commit
-        head_commit = payload.get("head_commit", {})
-        if not head_commit:
+        # Skip if not a branch push, or a branch deletion (no head commit)
+        if not event.ref.startswith("refs/heads/") or not event.head_commit_id:
             return None
         
-        commit_sha = head_commit.get("id")
-        if not commit_sha:
-            return None
-        
-        # Find user who owns this repository config
-        # This is simplified - in reality, you would need to look up which user has this repo configured
-        from app.database.user_crud import get_users
-        users = get_users(db)
+        repo_name = event.repo_full_name
+        branch = event.ref[len("refs/heads/"):]
+        commit_sha = event.head_commit_id
         
-        for user in users:
-            # Check if user has a deployment config for this repo
-            config = get_deployment_config(db, repo_name, user.id)
-            if not config:
-                continue
+        # Users with an auto-deploy config for this repository and branch (cached, see config_index)
+        for user_id in get_auto_deploy_user_ids(db, repo_name, branch):
+            # Create deployment request
+            request = DeploymentRequest(
+                repo_full_name=repo_name,
+                commit_sha=commit_sha,
+                branch=branch,
+                manual_trigger=False,
+                triggered_by="webhook"
+            )
             
-            # Check if auto-deploy is enabled and branch matches
-            if config.auto_deploy and config.branch == branch:
-                # Create deployment request
-                request = DeploymentRequest(
-                    repo_full_name=repo_name,
-                    commit_sha=commit_sha,
-                    branch=branch,
-                    manual_trigger=False,
-                    triggered_by="webhook"
-                )
-                
-                # Start deployment
-                success, message, deployment_id = start_deployment(db, user.id, request)
-                if success:
-                    logger.info(f"Auto-deployment triggered for {repo_name} at commit {commit_sha}")
-                    return deployment_id
-                else:
-                    logger.error(f"Failed to trigger auto-deployment: {message}")
+            # Create deployment record
+            deployment = create_deployment(db, user_id, request)
+            if deployment:
+                logger.info(f"Auto-deployment created for {repo_name} at commit {commit_sha}")
+                return deployment.id
+            else:
+                logger.error("Failed to trigger auto-deployment: Failed to create deployment record")
         
         return None
     
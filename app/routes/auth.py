@@ -1,54 +1,198 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks, status, Depends, Header, Response, Cookie
-from fastapi.responses import RedirectResponse
-from fastapi.security import HTTPBearer, OAuth2PasswordBearer, HTTPAuthorizationCredentials
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import asyncio
+import base64
+import hashlib
+import hmac
 import httpx
 import logging
-from typing import Dict, Optional, Any
+import math
+import orjson
+from typing import Dict, Optional, Any, Tuple
+from cachetools import TTLCache
 import jwt
 import os
-from datetime import datetime, timedelta
+import time
+from functools import lru_cache
+from urllib.parse import quote, urlencode
 
 from app.settings import settings
 from app.database.database import get_db
+from app.database.token_revocation import is_revoked, revoke_token
 from app.database.user_crud import (
-    get_user_by_email, create_user, get_user_by_id, 
-    verify_password, create_or_update_github_user,
-    link_github_account, get_user_by_github_id
-)
-from app.schemas.user_models import (
-    UserResponse, LoginRequest, 
-    RegisterRequest, TokenResponse, GitHubTokenResponse
+    get_user_by_email, create_user, get_user_by_id, get_user_row,
+    ahash_password, averify_password, create_or_update_github_user,
+    link_github_account
 )
+from app.schemas.user_models import LoginRequest, RegisterRequest, TokenResponse
 from sqlalchemy.orm import Session
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 http_bearer_scheme = HTTPBearer(auto_error=False)
-oauth2_scheme = OAuth2PasswordBearer(
-    tokenUrl="auth/login",
-    auto_error=False,
-    description="JWT token obtained from the login or register endpoints"
-)
 
 # JWT settings
-JWT_SECRET = os.getenv("JWT_SECRET", settings.PASSWORD or "your-secret-key")
+# An empty JWT_SECRET counts as unset rather than becoming an empty HMAC key
+JWT_SECRET = os.getenv("JWT_SECRET") or settings.PASSWORD or "your-secret-key"
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_MINUTES = 60 * 24  # 24 hours
+_JWT_EXPIRATION_SECONDS = JWT_EXPIRATION_MINUTES * 60
+
+# Built once rather than on every decode: the decoder with its options, the
+# algorithm list, and the secret already encoded to bytes
+_JWT_KEY = JWT_SECRET.encode()
+_JWT_ALGORITHMS = [JWT_ALGORITHM]
+# exp is not verified here: verify_token checks it on every call, cached or not
+_jwt = jwt.PyJWT(options={"verify_signature": True, "verify_exp": False, "require": ["exp"]})
+# HMAC state with the key already absorbed; each verification works on a copy.
+# Named by string so hmac uses OpenSSL's HMAC, whose SHA-256 uses the CPU's SHA
+# extensions where available, rather than its pure-Python fallback
+_JWT_HMAC = hmac.new(_JWT_KEY, digestmod="sha256")
+# Every token we issue has the same header, so its encoded segment is built once
+_JWT_HEADER_SEGMENT = base64.urlsafe_b64encode(
+    orjson.dumps({"alg": JWT_ALGORITHM, "typ": "JWT"})
+).rstrip(b"=") + b"."
+# Claims the HS256 fast path leaves to PyJWT, which validates them
+_JWT_PYJWT_CLAIMS = frozenset(("nbf", "iat", "aud", "iss"))
+
+# Fields of GitHub's /user response that QUARK uses
+GITHUB_USER_FIELDS = ("id", "login", "email", "name", "avatar_url")
+
+# Scopes a GitHub token needs to manage repositories and their webhooks
+GITHUB_REQUIRED_SCOPES = frozenset(("repo", "admin:repo_hook"))
+
+# Pause before retrying a GitHub API GET that timed out or failed to connect
+GITHUB_RETRY_DELAY = 0.5  # seconds
+
+# GitHub users validated by get_github_user, keyed by a digest of their token
+GITHUB_USER_CACHE_SIZE = 10_000
+GITHUB_USER_CACHE_TTL = 120  # seconds
+_github_users: TTLCache = TTLCache(maxsize=GITHUB_USER_CACHE_SIZE, ttl=GITHUB_USER_CACHE_TTL)
+# Validations in flight, so concurrent requests with the same token share one API call
+# and its result, whether the token turns out valid or not
+_github_user_fetches: Dict[bytes, "asyncio.Task[Optional[Dict[str, Any]]]"] = {}
+
+# OAuth settings are fixed once the app starts, so the values built from them are too
+_CLIENT_ID = settings.CLIENT_ID
+_CLIENT_SECRET = settings.CLIENT_SECRET
+_LOGIN_REDIRECT_URL = f"{settings.FRONTEND_URL}/login?"
+# Login redirects for the callback's own error codes; GitHub's codes are encoded per request
+_LOGIN_ERROR_URLS = {
+    error: _LOGIN_REDIRECT_URL + urlencode({"error": error})
+    for error in ("no_token", "github_api_error", "server_error")
+}
+
+# Only the state parameter varies per request
+_GITHUB_AUTHORIZE_URL = "https://github.com/login/oauth/authorize?" + urlencode({
+    "client_id": _CLIENT_ID or "",
+    "redirect_uri": settings.REDIRECT_URI or "",
+    "scope": "repo admin:repo_hook",
+    "state": ""
+})
+_GITHUB_LOGIN_RESPONSE = {"login_url": _GITHUB_AUTHORIZE_URL}
+# Body of the code-for-token exchange, without the code
+_GITHUB_TOKEN_REQUEST = {
+    "client_id": _CLIENT_ID,
+    "client_secret": _CLIENT_SECRET,
+    "redirect_uri": settings.REDIRECT_URI
+}
+
+def _parse_github_user(content: bytes) -> Dict[str, Any]:
+    """Parse a GitHub /user response, keeping only GITHUB_USER_FIELDS so the full payload is freed at once"""
+    profile = orjson.loads(content)
+    return {field: profile.get(field) for field in GITHUB_USER_FIELDS}
+
+def _login_redirect(**params: str) -> Response:
+    """Redirect to the frontend login page with URL-encoded query parameters"""
+    # A bare Response skips RedirectResponse re-quoting the already encoded URL
+    return Response(status_code=status.HTTP_302_FOUND, headers={"location": _LOGIN_REDIRECT_URL + urlencode(params)})
+
+def _login_error(error: str) -> Response:
+    """Redirect to the frontend login page with an error code"""
+    url = _LOGIN_ERROR_URLS.get(error) or _LOGIN_REDIRECT_URL + urlencode({"error": error})
+    return Response(status_code=status.HTTP_302_FOUND, headers={"location": url})
 
 def create_jwt_token(data: Dict[str, Any]) -> str:
     """Create a new JWT token"""
-    expiration = datetime.utcnow() + timedelta(minutes=JWT_EXPIRATION_MINUTES)
-    to_encode = data.copy()
-    to_encode.update({"exp": expiration})
-    return jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    # A random JWT ID lets this one token be revoked (see token_revocation)
+    to_encode = {**data, "exp": int(time.time()) + _JWT_EXPIRATION_SECONDS, "jti": os.urandom(16).hex()}
+    signing_input = _JWT_HEADER_SEGMENT + _b64url_encode(orjson.dumps(to_encode))
+    mac = _JWT_HMAC.copy()
+    mac.update(signing_input)
+    return (signing_input + b"." + _b64url_encode(mac.digest())).decode("ascii")
+
+def _b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+def _is_numeric_date(value: Any) -> bool:
+    """RFC 7519 NumericDate: an int or finite float, but not a bool"""
+    return type(value) is int or (type(value) is float and math.isfinite(value))
+
+def _decode_hs256(token: str) -> Optional[Dict[str, Any]]:
+    """Verify a token shaped like the ones create_jwt_token issues, without PyJWT
+
+    Returns None for anything else (other headers, claims PyJWT must validate,
+    malformed input) so the caller falls back to PyJWT and its errors.
+    """
+    try:
+        raw = token.encode("ascii")
+        if raw.count(b".") != 2:
+            return None
+        signing_input, _, signature = raw.rpartition(b".")
+        header_segment, _, payload_segment = signing_input.partition(b".")
+        header = orjson.loads(_b64url_decode(header_segment))
+        if not isinstance(header, dict) or header.get("alg") != JWT_ALGORITHM or not header.keys() <= {"alg", "typ"}:
+            return None
+        payload = orjson.loads(_b64url_decode(payload_segment))
+        if not isinstance(payload, dict) or not payload.keys().isdisjoint(_JWT_PYJWT_CLAIMS):
+            return None
+        exp = payload.get("exp")
+        if not _is_numeric_date(exp):
+            return None
+        # Rejecting an expired token is the same answer with or without a valid
+        # signature, so skip the HMAC for it
+        if exp <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        mac = _JWT_HMAC.copy()
+        mac.update(signing_input)
+        # Compared in encoded form: base64 decoding skips stray characters, so only
+        # the one canonical spelling of the signature is accepted
+        if not hmac.compare_digest(_b64url_encode(mac.digest()), signature):
+            raise jwt.InvalidSignatureError("Signature verification failed")
+    except ValueError:
+        return None
+    return payload
+
+@lru_cache(maxsize=4096)
+def _decode_token(token: str) -> Tuple[Dict[str, Any], float]:
+    # Only successful decodes are cached; invalid tokens raise and are checked again next time
+    payload = _decode_hs256(token)
+    if payload is None:
+        payload = _jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGORITHMS)
+        # With verify_exp off PyJWT no longer checks the claim's type either
+        if not _is_numeric_date(payload["exp"]):
+            raise jwt.DecodeError("Expiration Time claim (exp) must be a number.")
+    return payload, payload["exp"]
 
 def verify_token(token: str) -> Optional[Dict[str, Any]]:
     """Verify a JWT token and return the decoded payload"""
-    logger.debug(f"Attempting to verify token: {token[:10]}...") # Log first few chars
+    logger.debug("Attempting to verify token: %.10s...", token) # Log first few chars
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        logger.debug(f"Token verified successfully for sub: {payload.get('sub')}")
-        return payload
+        payload, exp = _decode_token(token)
+        # A cached token can expire after it was decoded
+        if exp <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        # Checked on every call, outside the decode cache
+        if is_revoked(payload.get("jti")):
+            logger.warning(f"Token has been revoked: {token[:10]}...")
+            return None
+        logger.debug("Token verified successfully for sub: %s", payload.get('sub'))
+        # A copy, so callers cannot alter the cached payload
+        return dict(payload)
     except jwt.ExpiredSignatureError:
         logger.warning(f"Token has expired: {token[:10]}...")
         return None
@@ -56,44 +200,47 @@ def verify_token(token: str) -> Optional[Dict[str, Any]]:
         logger.warning(f"Token verification failed: {str(e)} - Token: {token[:10]}...")
         return None
 
-async def get_user_from_token(
-    auth: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer_scheme),
-    db: Session = Depends(get_db)
-) -> Optional[Dict[str, Any]]:
-    """Get user from JWT token provided via HTTP Bearer authentication.
-    Handles token verification and user lookup.
-    Used as a dependency for protected routes.
-    """
-    if auth is None:
-        logger.warning("get_user_from_token: No valid HTTPBearer credentials found.")
+def _authenticate(credentials: Optional[HTTPAuthorizationCredentials], db: Session) -> Optional[Dict[str, Any]]:
+    """Verify the bearer JWT and return its user as a dict, or None if unauthenticated"""
+    if credentials is None:
+        logger.warning("No valid HTTPBearer credentials found.")
         return None
-        
-    token = auth.credentials
-    logger.debug(f"get_user_from_token received token via HTTPBearer: {token[:10]}...")
     
+    token = credentials.credentials
     payload = verify_token(token)
     if not payload or "sub" not in payload:
         logger.warning(f"Token verification failed or 'sub' missing for token: {token[:10]}...")
         return None
     
     user_id = payload["sub"]
-    user = get_user_by_id(db, user_id)
+    user = get_user_row(db, user_id)
     if not user:
         logger.warning(f"User not found in DB for sub: {user_id}")
         return None
     
-    logger.info(f"Authenticated user: {user.username} (ID: {user.id})")
-    
+    logger.info("Authenticated user: %s (ID: %s)", user["username"], user["id"])
     return {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "github_connected": bool(user.github_id),
-        "github_token": user.github_access_token,
-        "auth_type": payload.get("auth_type", "github" if user.github_id else "password"),
-        "original_token": token
+        "id": user["id"],
+        "username": user["username"],
+        "email": user["email"],
+        "github_connected": bool(user["github_id"]),
+        "github_token": user["github_access_token"],
+        "auth_type": payload.get("auth_type", "github" if user["github_id"] else "password")
     }
 
+async def get_user_from_token(
+    auth: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Dict[str, Any]]:
+    """Get user from JWT token provided via HTTP Bearer authentication.
+    Handles token verification and user lookup.
+    Used as a dependency for protected routes.
+    """
+    user = _authenticate(auth, db)
+    if user:
+        user["original_token"] = auth.credentials
+    return user
+
 @router.post(
     "/register",
     summary="Register a new user",
@@ -143,8 +290,9 @@ async def register(user_data: RegisterRequest, db: Session = Depends(get_db)):
             detail="Email already registered"
         )
     
-    # Create new user
-    new_user = create_user(db, user_data)
+    # Create new user, hashing the password in the worker pool
+    password_hash = await ahash_password(user_data.password) if user_data.password else None
+    new_user = create_user(db, user_data, password_hash=password_hash)
     
     # Generate JWT token
     token_data = {
@@ -155,8 +303,8 @@ async def register(user_data: RegisterRequest, db: Session = Depends(get_db)):
     }
     access_token = create_jwt_token(token_data)
     
-    # Return token and user data
-    return {
+    # Return token and user data; returned as-is rather than revalidated against TokenResponse
+    return ORJSONResponse({
         "access_token": access_token,
         "token_type": "bearer",
         "user": {
@@ -166,7 +314,7 @@ async def register(user_data: RegisterRequest, db: Session = Depends(get_db)):
             "github_connected": False,
             "auth_type": "password"
         }
-    }
+    }, status_code=status.HTTP_201_CREATED)
 
 @router.post(
     "/login",
@@ -209,7 +357,7 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     - Your JWT token will work for all API endpoints
     """
     user = get_user_by_email(db, login_data.email)
-    if not user or not verify_password(user, login_data.password):
+    if not user or not await averify_password(user, login_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
@@ -225,8 +373,8 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     }
     access_token = create_jwt_token(token_data)
     
-    # Return token and user data
-    return {
+    # Return token and user data; returned as-is rather than revalidated against TokenResponse
+    return ORJSONResponse({
         "access_token": access_token,
         "token_type": "bearer",
         "user": {
@@ -237,7 +385,7 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             "github_token": user.github_access_token,
             "auth_type": "password"
         }
-    }
+    })
 
 @router.get(
     "/github/login",
@@ -281,14 +429,13 @@ async def github_login(user_id: Optional[str] = None):
     
     For account linking, pass the user's ID in the user_id query parameter.
     """
-    if not settings.CLIENT_ID:
+    if not _CLIENT_ID:
         raise HTTPException(status_code=500, detail="CLIENT_ID not configured")
     
-    scope = "repo admin:repo_hook"
-    state = user_id or ""  # Pass user_id as state for account linking
-    github_auth_url = f"https://github.com/login/oauth/authorize?client_id={settings.CLIENT_ID}&redirect_uri={settings.REDIRECT_URI}&scope={scope}&state={state}"
-    
-    return {"login_url": github_auth_url}
+    if not user_id:
+        return _GITHUB_LOGIN_RESPONSE
+    # Pass user_id as state for account linking
+    return {"login_url": _GITHUB_AUTHORIZE_URL + quote(user_id, safe="")}
 
 @router.get(
     "/callback",
@@ -307,7 +454,7 @@ async def github_login(user_id: Optional[str] = None):
         }
     }
 )
-async def github_callback(code: str, state: Optional[str] = None, background_tasks: BackgroundTasks = None, db: Session = Depends(get_db)):
+async def github_callback(request: Request, code: str, state: Optional[str] = None, db: Session = Depends(get_db)):
     """
     Handles the GitHub OAuth callback process.
     
@@ -319,109 +466,99 @@ async def github_callback(code: str, state: Optional[str] = None, background_tas
     5. Redirects to the frontend with our JWT token
     
     Args:
+        request (Request): Incoming request, used to reach the shared HTTP client
         code (str): Temporary code from GitHub OAuth process
         state (str, optional): State parameter, used for account linking
-        background_tasks (BackgroundTasks): FastAPI background tasks handler
         db (Session): Database session
     
     Returns:
-        RedirectResponse: Redirects to frontend with token or error message
+        Response: 302 redirect to the frontend with token or error message
     """
-    if not settings.CLIENT_ID or not settings.CLIENT_SECRET:
+    if not _CLIENT_ID or not _CLIENT_SECRET:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="CLIENT_ID or CLIENT_SECRET not configured"
         )
     
     try:
+        # Shared client created at startup, so GitHub connections are pooled across logins
+        client = request.app.state.http
         # Exchange code for access token
-        async with httpx.AsyncClient() as client:
-            # Get GitHub access token
-            response = await client.post(
-                "https://github.com/login/oauth/access_token",
-                data={
-                    "client_id": settings.CLIENT_ID,
-                    "client_secret": settings.CLIENT_SECRET,
-                    "code": code,
-                    "redirect_uri": settings.REDIRECT_URI
-                },
-                headers={"Accept": "application/json"}
-            )
-            
-            token_data = response.json()
-            
-            if "error" in token_data:
-                logger.error(f"GitHub OAuth error: {token_data['error']}")
-                return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error={token_data['error']}")
-            
-            github_token = token_data.get("access_token")
-            
-            if not github_token:
-                logger.error("No access token in GitHub response")
-                return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error=no_token")
+        response = await client.post(
+            "https://github.com/login/oauth/access_token",
+            data={**_GITHUB_TOKEN_REQUEST, "code": code},
+            headers={"Accept": "application/json"}
+        )
+        
+        token_data = orjson.loads(response.content)
+        
+        if "error" in token_data:
+            logger.error(f"GitHub OAuth error: {token_data['error']}")
+            return _login_error(token_data['error'])
+        
+        github_token = token_data.get("access_token")
+        
+        if not github_token:
+            logger.error("No access token in GitHub response")
+            return _login_error("no_token")
+        
+        # Use token to get user information
+        user_response = await _get_github_user_response(client, github_token)
+        
+        if user_response.status_code != 200:
+            logger.error(f"GitHub API error: {user_response.text}")
+            return _login_error("github_api_error")
+        
+        github_user_data = _parse_github_user(user_response.content)
+        github_user_data["token"] = github_token  # Add token to user data
+        
+        # Check if we're linking to an existing account
+        if state and state.strip():
+            user_id = state.strip()
+            user = get_user_by_id(db, user_id)
             
-            # Use token to get user information
-            user_response = await client.get(
-                "https://api.github.com/user",
-                headers={
-                    "Authorization": f"Bearer {github_token}",
-                    "Accept": "application/vnd.github.v3+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
+            # If user exists, link GitHub account
+            if user:
+                linked_user = link_github_account(db, user.id, github_user_data)
+                
+                # Create JWT token for our system
+                token_data = {
+                    "sub": linked_user.id,
+                    "username": linked_user.username,
+                    "email": linked_user.email,
+                    "auth_type": "password",  # Still a password account, but linked
+                    "github_id": str(github_user_data.get("id"))
                 }
-            )
-            
-            if user_response.status_code != 200:
-                logger.error(f"GitHub API error: {user_response.text}")
-                return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error=github_api_error")
-            
-            github_user_data = user_response.json()
-            github_user_data["token"] = github_token  # Add token to user data
-            
-            # Check if we're linking to an existing account
-            if state and state.strip():
-                user_id = state.strip()
-                user = get_user_by_id(db, user_id)
+                our_token = create_jwt_token(token_data)
                 
-                # If user exists, link GitHub account
-                if user:
-                    linked_user = link_github_account(db, user.id, github_user_data)
-                    
-                    # Create JWT token for our system
-                    token_data = {
-                        "sub": linked_user.id,
-                        "username": linked_user.username,
-                        "email": linked_user.email,
-                        "auth_type": "password",  # Still a password account, but linked
-                        "github_id": str(github_user_data.get("id"))
-                    }
-                    our_token = create_jwt_token(token_data)
-                    
-                    # Redirect to frontend with token
-                    return RedirectResponse(
-                        url=f"{settings.FRONTEND_URL}/login?token={our_token}&provider=github&linked=true"
-                    )
-            
-            # Create or update user in our database
-            user = create_or_update_github_user(db, github_user_data)
-            
-            # Create JWT token for our system
-            token_data = {
-                "sub": user.id,
-                "username": user.username,
-                "email": user.email,
-                "auth_type": "github",
-                "github_id": str(github_user_data.get("id"))
-            }
-            our_token = create_jwt_token(token_data)
-            
-            # Redirect to frontend with token
-            return RedirectResponse(
-                url=f"{settings.FRONTEND_URL}/login?token={our_token}&provider=github"
-            )
-    
+                # Redirect to frontend with token
+                return _login_redirect(token=our_token, provider="github", linked="true")
+        
+        # Create or update user in our database
+        user = create_or_update_github_user(db, github_user_data)
+        
+        # Create JWT token for our system
+        token_data = {
+            "sub": user.id,
+            "username": user.username,
+            "email": user.email,
+            "auth_type": "github",
+            "github_id": str(github_user_data.get("id"))
+        }
+        our_token = create_jwt_token(token_data)
+        
+        # Redirect to frontend with token
+        return _login_redirect(token=our_token, provider="github")
+    
+    except httpx.HTTPError as e:
+        logger.error(f"Error contacting GitHub in OAuth callback: {str(e)}")
+        return _login_error("github_api_error")
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Invalid response from GitHub in OAuth callback: {str(e)}")
+        return _login_error("github_api_error")
     except Exception as e:
         logger.error(f"Error in GitHub OAuth callback: {str(e)}")
-        return RedirectResponse(url=f"{settings.FRONTEND_URL}/login?error=server_error")
+        return _login_error("server_error")
 
 @router.get(
     "/me",
@@ -470,9 +607,51 @@ async def get_me(current_user: Dict[str, Any] = Depends(get_user_from_token)):
             detail="Not authenticated"
         )
     
-    return current_user
+    # Plain JSON values only; returned as-is rather than revalidated against Dict[str, Any]
+    return ORJSONResponse(current_user)
 
-async def get_current_user(token: Optional[str] = Depends(http_bearer_scheme), db: Session = Depends(get_db)):
+@router.post(
+    "/logout",
+    summary="Revoke the current JWT token",
+    response_model=Dict[str, str],
+    responses={
+        200: {
+            "description": "Token revoked",
+            "content": {
+                "application/json": {
+                    "example": {"message": "Logged out"}
+                }
+            }
+        },
+        401: {"description": "Not authenticated"},
+    }
+)
+async def logout(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer_scheme),
+    db: Session = Depends(get_db)
+):
+    """
+    Log out by revoking the JWT token in the Authorization header.
+    
+    The token is rejected by every endpoint from then on, until it would have
+    expired anyway. Other tokens of the same user stay valid.
+    """
+    payload = verify_token(credentials.credentials) if credentials else None
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    
+    if payload.get("jti"):
+        revoke_token(db, payload["jti"], payload["exp"])
+        logger.info(f"Revoked token {payload['jti']} of user {payload.get('sub')}")
+    return {"message": "Logged out"}
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer_scheme),
+    db: Session = Depends(get_db)
+) -> Optional[Dict[str, Any]]:
     """
     Get the authenticated user from the JWT token.
     
@@ -482,39 +661,33 @@ async def get_current_user(token: Optional[str] = Depends(http_bearer_scheme), d
     3. Returns None if not authenticated
     
     Args:
-        token: HTTPAuthorizationCredentials from request (or None)
+        credentials: HTTPAuthorizationCredentials from request (or None)
         db: Database session
         
     Returns:
         Optional[Dict[str, Any]]: User information if authenticated, None otherwise
     """
-    if token is None:
-        logger.warning("get_current_user: No HTTPBearer credentials provided.")
-        return None
-    
-    actual_token = token.credentials
-    payload = verify_token(actual_token)
-    if not payload or "sub" not in payload:
-        logger.warning(f"get_current_user: Token verification failed or 'sub' missing.")
-        return None
-    
-    user_id = payload["sub"]
-    user = get_user_by_id(db, user_id)
-    if not user:
-        logger.warning(f"get_current_user: User not found for sub: {user_id}")
-        return None
-    
-    logger.info(f"get_current_user succeeded for user: {user.username}")
-    return {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "github_connected": bool(user.github_id),
-        "github_token": user.github_access_token,
-        "auth_type": payload.get("auth_type", "github" if user.github_id else "password")
+    return _authenticate(credentials, db)
+
+async def _get_github_user_response(client: httpx.AsyncClient, token: str) -> httpx.Response:
+    """GET api.github.com/user with a GitHub token, retrying once after a connect error or timeout"""
+    headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.v3+json",
+        "X-GitHub-Api-Version": "2022-11-28"
     }
+    try:
+        return await client.get("https://api.github.com/user", headers=headers)
+    except (httpx.TimeoutException, httpx.ConnectError) as e:
+        logger.warning(f"Transient error contacting GitHub, retrying: {str(e)}")
+        await asyncio.sleep(GITHUB_RETRY_DELAY)
+        return await client.get("https://api.github.com/user", headers=headers)
+
+def _github_token_key(token: str) -> bytes:
+    # A digest, so raw GitHub tokens are not kept in the cache
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
 
-async def get_github_user(token: str):
+async def get_github_user(token: str, client: httpx.AsyncClient):
     """
     Get the authenticated user from the GitHub token.
     
@@ -523,8 +696,12 @@ async def get_github_user(token: str):
     2. Returns the user information if authenticated
     3. Returns None if not authenticated
     
+    Validated users are cached for GITHUB_USER_CACHE_TTL seconds, and concurrent
+    requests with the same uncached token await a single GitHub API call.
+    
     Args:
         token: GitHub token
+        client: Shared HTTP client (app.state.http)
         
     Returns:
         Optional[Dict[str, Any]]: User information if authenticated, None otherwise
@@ -533,61 +710,80 @@ async def get_github_user(token: str):
         logger.warning("No token provided")
         return None
     
+    key = _github_token_key(token)
+    user = _github_users.get(key)
+    if user is None:
+        fetch = _github_user_fetches.get(key)
+        if fetch is None:
+            fetch = asyncio.create_task(_fetch_and_cache_github_user(token, client, key))
+            _github_user_fetches[key] = fetch
+            fetch.add_done_callback(lambda _: _github_user_fetches.pop(key, None))
+        # Shielded so a cancelled request does not cancel the fetch others are awaiting
+        user = await asyncio.shield(fetch)
+        if user is None:
+            return None
+    return {**user, "token": token}  # Include the token for downstream use
+
+async def _fetch_and_cache_github_user(token: str, client: httpx.AsyncClient, key: bytes) -> Optional[Dict[str, Any]]:
+    user = await _fetch_github_user(token, client)
+    if user is not None:
+        _github_users[key] = user
+    return user
+
+async def _fetch_github_user(token: str, client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """Validate a GitHub token against the GitHub API and return the user without the token"""
     try:
-        # Log masked token for debugging (showing only first and last 4 chars)
         token_length = len(token) if isinstance(token, str) else 0
         if token_length > 8:
-            masked_token = token[:4] + '*' * (token_length - 8) + token[-4:]
-            logger.info(f"Using token: {masked_token}")
+            # Log masked token for debugging (showing only first and last 4 chars)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Using token: %s", token[:4] + '*' * (token_length - 8) + token[-4:])
         else:
             logger.warning("Token too short or invalid format")
             return None
             
-        async with httpx.AsyncClient() as client:
-            logger.info("Making GitHub API request to validate token")
-            response = await client.get(
-                "https://api.github.com/user",
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "Accept": "application/vnd.github.v3+json",
-                    "X-GitHub-Api-Version": "2022-11-28"
-                }
-            )
-            
-            status_code = response.status_code
-            logger.info(f"GitHub API response status: {status_code}")
-            
-            if status_code == 401:
-                logger.error("Token is invalid or expired")
-                return None
-            elif status_code == 403:
-                logger.error("Token lacks required permissions")
-                return None
-            elif status_code != 200:
-                logger.error(f"GitHub API error: {response.text}")
-                return None
-            
-            user_data = response.json()
-            logger.info(f"Successfully authenticated as GitHub user: {user_data.get('login')}")
-            
-            # Verify required scopes
-            scopes = response.headers.get("X-OAuth-Scopes", "").split(", ")
-            required_scopes = ["repo", "admin:repo_hook"]
-            missing_scopes = [scope for scope in required_scopes if scope not in scopes]
-            
-            if missing_scopes:
-                logger.error(f"Token missing required scopes: {', '.join(missing_scopes)}")
-                return None
-            
-            return {
-                "id": str(user_data.get("id")),
-                "username": user_data.get("login"),
-                "email": user_data.get("email") or f"{user_data.get('login')}@github.com",
-                "name": user_data.get("name"),
-                "avatar_url": user_data.get("avatar_url"),
-                "token": token  # Include the token for downstream use
-            }
-    
+        # Shared client, so repeated validations reuse pooled GitHub connections
+        logger.info("Making GitHub API request to validate token")
+        response = await _get_github_user_response(client, token)
+        
+        status_code = response.status_code
+        logger.info("GitHub API response status: %s", status_code)
+        
+        if status_code == 401:
+            logger.error("Token is invalid or expired")
+            return None
+        elif status_code == 403:
+            logger.error("Token lacks required permissions")
+            return None
+        elif status_code != 200:
+            logger.error(f"GitHub API error: {response.text}")
+            return None
+        
+        user_data = _parse_github_user(response.content)
+        logger.info("Successfully authenticated as GitHub user: %s", user_data.get('login'))
+        
+        # Verify required scopes
+        scopes = frozenset(response.headers.get("X-OAuth-Scopes", "").split(", "))
+        missing_scopes = GITHUB_REQUIRED_SCOPES - scopes
+        
+        if missing_scopes:
+            logger.error(f"Token missing required scopes: {', '.join(sorted(missing_scopes))}")
+            return None
+        
+        return {
+            "id": str(user_data.get("id")),
+            "username": user_data.get("login"),
+            "email": user_data.get("email") or f"{user_data.get('login')}@github.com",
+            "name": user_data.get("name"),
+            "avatar_url": user_data.get("avatar_url")
+        }
+
+    except httpx.HTTPError as e:
+        logger.error(f"Error contacting GitHub to authenticate user: {str(e)}")
+        return None
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Invalid response from GitHub while authenticating user: {str(e)}")
+        return None
     except Exception as e:
         logger.error(f"Error authenticating user: {str(e)}")
         return None
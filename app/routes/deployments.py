@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Security, WebSocket
+from fastapi import APIRouter, Depends, HTTPException, Query, Security, WebSocket
 from fastapi.security import OAuth2PasswordBearer, HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
@@ -26,6 +26,7 @@ from app.database.deployment_crud import (
     list_deployments,
     delete_deployment
 )
+from app.database.deployment_logs import get_deployment_logs as get_deployment_log_entries
 from app.deployment.engine import (
     start_deployment,
     cancel_deployment,
@@ -483,7 +484,6 @@ async def delete_config(
 )
 async def trigger_deployment(
     request: DeploymentRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -802,7 +802,7 @@ async def get_deployment_logs(
         "deployment_id": deployment.id,
         "repo_full_name": deployment.repo_full_name,
         "status": deployment.status,
-        "logs": deployment.logs
+        "logs": [entry.to_log_line() for entry in get_deployment_log_entries(deployment.id)]
     }
 
 
@@ -934,8 +934,7 @@ async def delete_deployment_endpoint(
         raise HTTPException(status_code=404, detail="Deployment not found or already deleted")
     
     # If deployment was in active_deployments cache, remove it
-    if deployment_id in active_deployments:
-        del active_deployments[deployment_id]
+    active_deployments.pop(deployment_id, None)
     
     return {"message": "Deployment deleted successfully"}
 
@@ -960,16 +959,19 @@ async def deployment_logs(websocket: WebSocket, deployment_id: str, token: str):
             return
             
         # Send existing logs
-        if deployment.logs:
-            for log in deployment.logs:
-                await websocket.send_text(json.dumps({
-                    "type": "log",
-                    "data": log
-                }))
+        log_offset = 0
+        for entry in get_deployment_log_entries(deployment_id):
+            await websocket.send_text(json.dumps({
+                "type": "log",
+                "data": entry.to_log_line()
+            }))
+            log_offset = entry.offset
         
         # Stream new logs
-        last_log_count = len(deployment.logs or [])
         while True:
+            # Drop cached rows so status changes from the deployment task are seen
+            db.expire_all()
+            
             # Check if deployment is still active
             if deployment_id not in active_deployments:
                 # Send final status
@@ -989,15 +991,12 @@ async def deployment_logs(websocket: WebSocket, deployment_id: str, token: str):
                 break
                 
             # Send new logs
-            current_logs = deployment.logs or []
-            if len(current_logs) > last_log_count:
-                new_logs = current_logs[last_log_count:]
-                for log in new_logs:
-                    await websocket.send_text(json.dumps({
-                        "type": "log",
-                        "data": log
-                    }))
-                last_log_count = len(current_logs)
+            for entry in get_deployment_log_entries(deployment_id, after=log_offset):
+                await websocket.send_text(json.dumps({
+                    "type": "log",
+                    "data": entry.to_log_line()
+                }))
+                log_offset = entry.offset
             
             # Send current status
             await websocket.send_text(json.dumps({
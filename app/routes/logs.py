@@ -1,27 +1,57 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import logging
+import orjson
 from app.websockets.logs import log_manager
 from app.routes.auth import get_current_user
 
-from app.database.database import get_db, RequestLogDB
+from app.database.database import get_async_db
+from app.database.request_log_crud import (
+    get_recent_logs,
+    get_logs_by_user,
+    get_logs_by_endpoint,
+    get_error_logs,
+    get_slow_requests
+)
 
 # Create router
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+
+def _as_json_text(value):
+    """Encode a JSON column value as text, as this endpoint has always returned it"""
+    return orjson.dumps(value).decode() if value is not None else None
+
+
 @router.get(
     "/",
     summary="Get API request logs",
-    description="Retrieves all API request logs"
+    description="Retrieves API request logs, optionally filtered by user, endpoint, errors or slow requests"
 )
 async def get_request_logs(
-    db: Session = Depends(get_db)
+    user_id: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    errors_only: bool = False,
+    slow_ms: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get all request logs without filtering.
+    Get request logs, newest first. Without filters all logs are returned.
     """
-    logs = db.query(RequestLogDB).order_by(RequestLogDB.timestamp.desc()).all()
+    # run_sync awaits the query helpers on the async connection without blocking the loop
+    if user_id:
+        logs = await db.run_sync(get_logs_by_user, user_id, limit or 100)
+    elif endpoint:
+        logs = await db.run_sync(get_logs_by_endpoint, endpoint, limit or 100)
+    elif errors_only:
+        logs = await db.run_sync(get_error_logs, limit or 100)
+    elif slow_ms is not None:
+        logs = await db.run_sync(get_slow_requests, slow_ms, limit or 100)
+    else:
+        logs = await db.run_sync(get_recent_logs, limit)
     
     # Convert SQLAlchemy models to dictionaries
     result = []
@@ -32,12 +62,13 @@ async def get_request_logs(
             "method": log.method,
             "status_code": log.status_code,
             "response_time_ms": log.response_time,
-            "request_data": log.request_body,
-            "response_data": log.response_body,
-            "headers": log.headers,
+            "request_data": _as_json_text(log.request_body),
+            "response_data": _as_json_text(log.response_body),
+            "headers": _as_json_text(log.headers),
             "timestamp": str(log.timestamp),
             "client_ip": log.client_ip,
-            "user_agent": log.user_agent
+            "user_agent": log.user_agent,
+            "user_id": log.user_id
         }
         result.append(log_dict)
     
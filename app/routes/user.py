@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 import logging
 import httpx
+import orjson
 from typing import Dict, List, Any
 
 from app.schemas.user_models import UserCreate
@@ -39,6 +40,7 @@ logger = logging.getLogger(__name__)
     }
 )
 async def get_user_profile(
+    request: Request,
     current_user: Dict = Depends(get_current_user),
     db_session: Session = Depends(get_db)
 ):
@@ -89,29 +91,29 @@ async def get_user_profile(
         #     logger.info(f"New user {new_user.username} has been created")
         
         # Get full GitHub profile using the stored GitHub token
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"Making GitHub API request to /user with token: {github_api_token[:4]}...")
-            response = await client.get(
-                "https://api.github.com/user",
-                headers={"Authorization": f"Bearer {github_api_token}"}
+        client = request.app.state.http
+        logger.debug(f"Making GitHub API request to /user with token: {github_api_token[:4]}...")
+        response = await client.get(
+            "https://api.github.com/user",
+            headers={"Authorization": f"Bearer {github_api_token}"}
+        )
+        
+        if response.status_code == 200:
+            github_user = orjson.loads(response.content)
+            # Ensure the email is included if missing from GitHub profile but present in our record
+            if ("email" not in github_user or not github_user["email"]) and current_user.get("email"):
+                github_user["email"] = current_user.get("email")
+            logger.info(f"Successfully fetched GitHub profile for {github_user.get('login')}")
+            return github_user
+        else:
+            # If we can't get the full profile, raise an error
+            error_detail = f"Failed to fetch GitHub profile: {response.status_code} - {response.text}"
+            logger.warning(error_detail)
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY, # 502 suggests an issue talking to the upstream service (GitHub)
+                detail=error_detail
             )
-            
-            if response.status_code == 200:
-                github_user = response.json()
-                # Ensure the email is included if missing from GitHub profile but present in our record
-                if ("email" not in github_user or not github_user["email"]) and current_user.get("email"):
-                    github_user["email"] = current_user.get("email")
-                logger.info(f"Successfully fetched GitHub profile for {github_user.get('login')}")
-                return github_user
-            else:
-                # If we can't get the full profile, raise an error
-                error_detail = f"Failed to fetch GitHub profile: {response.status_code} - {response.text}"
-                logger.warning(error_detail)
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY, # 502 suggests an issue talking to the upstream service (GitHub)
-                    detail=error_detail
-                )
-    
+
     except httpx.RequestError as exc:
         error_detail = f"Error communicating with GitHub API: {exc}"
         logger.error(error_detail)
@@ -147,7 +149,7 @@ async def get_user_profile(
         500: {"description": "Server error"}
     }
 )
-async def get_user_repos(current_user: Dict = Depends(get_current_user)):
+async def get_user_repos(request: Request, current_user: Dict = Depends(get_current_user)):
     """
     Retrieves the authenticated user's GitHub repositories using their stored token.
     
@@ -188,23 +190,23 @@ async def get_user_repos(current_user: Dict = Depends(get_current_user)):
         auth_header = f"Bearer {github_api_token}"
         logger.info(f"Getting repositories for user: {current_user.get('username')} using stored token.")
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                "https://api.github.com/user/repos?sort=updated&per_page=100",
-                headers={"Authorization": auth_header}
+        client = request.app.state.http
+        response = await client.get(
+            "https://api.github.com/user/repos?sort=updated&per_page=100",
+            headers={"Authorization": auth_header}
+        )
+        
+        if response.status_code == 200:
+            logger.info(f"Successfully fetched repositories for {current_user.get('username')}")
+            return orjson.loads(response.content)
+        else:
+            error_message = f"GitHub API error fetching repos: {response.status_code}"
+            logger.error(f"{error_message} - {response.text}")
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY, 
+                detail=f"{error_message}. Please check your GitHub token permissions or validity."
             )
-            
-            if response.status_code == 200:
-                logger.info(f"Successfully fetched repositories for {current_user.get('username')}")
-                return response.json()
-            else:
-                error_message = f"GitHub API error fetching repos: {response.status_code}"
-                logger.error(f"{error_message} - {response.text}")
-                raise HTTPException(
-                    status_code=status.HTTP_502_BAD_GATEWAY, 
-                    detail=f"{error_message}. Please check your GitHub token permissions or validity."
-                )
-    
+
     except httpx.RequestError as exc:
         error_detail = f"Error communicating with GitHub API for repos: {exc}"
         logger.error(error_detail)
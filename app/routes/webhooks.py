@@ -1,21 +1,24 @@
-from fastapi import APIRouter, Request, HTTPException, Depends, BackgroundTasks, status
+from fastapi import APIRouter, Request, HTTPException, Depends, status
 from sqlalchemy.orm import Session
 import logging
 from datetime import datetime
-import httpx
+import orjson
+from pydantic import ValidationError
 from typing import List, Dict, Any
 
 from app.database.database import get_db
 from app.database.webhook_crud import (
     add_webhook_event,
-    add_or_update_registered_webhook
+    add_or_update_registered_webhook,
+    get_webhook_by_repository
 )
 from app.settings import settings
 from app.routes.auth import get_user_from_token
 from app.utils.webhook_utils import (
     create_webhook,
     check_existing_webhook)
-from app.deployment.engine import process_webhook_event
+from app.deployment import dispatcher
+from app.schemas.models import PushEvent
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -46,6 +49,7 @@ logger = logging.getLogger(__name__)
     }
 )
 async def get_repo_commits(
+    request: Request,
     owner: str,
     repo: str,
     current_user: Dict[str, Any] = Depends(get_user_from_token)
@@ -75,30 +79,30 @@ async def get_repo_commits(
     token = current_user["github_token"]
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.github.com/repos/{owner}/{repo}/commits",
-                headers={"Authorization": f"Bearer {token}"},
-                params={"page": 1 , "per_page":100}
-            )
-            
-            if response.status_code == 200:
-                commits = response.json()
-                # Fetch additional details for each commit
-                detailed_commits = []
-                for commit in commits:
-                    commit_sha = commit['sha']
-                    details_response = await client.get(
-                        f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}",
-                        headers={"Authorization": f"Bearer {token}"}
-                    )
-                    if details_response.status_code == 200:
-                        detailed_commits.append(details_response.json())
-                return detailed_commits
-            else:
-                logger.error(f"GitHub API error: {response.text}")
-                raise HTTPException(status_code=response.status_code, detail=response.text)
-    
+        client = request.app.state.http
+        response = await client.get(
+            f"https://api.github.com/repos/{owner}/{repo}/commits",
+            headers={"Authorization": f"Bearer {token}"},
+            params={"page": 1 , "per_page":100}
+        )
+        
+        if response.status_code == 200:
+            commits = orjson.loads(response.content)
+            # Fetch additional details for each commit
+            detailed_commits = []
+            for commit in commits:
+                commit_sha = commit['sha']
+                details_response = await client.get(
+                    f"https://api.github.com/repos/{owner}/{repo}/commits/{commit_sha}",
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                if details_response.status_code == 200:
+                    detailed_commits.append(orjson.loads(details_response.content))
+            return detailed_commits
+        else:
+            logger.error(f"GitHub API error: {response.text}")
+            raise HTTPException(status_code=response.status_code, detail=response.text)
+
     except Exception as e:
         logger.error(f"Error fetching repo commits: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -126,7 +130,7 @@ async def get_repo_commits(
     }
 )
 async def setup_webhook(
-    background_tasks: BackgroundTasks,
+    request: Request,
     owner: str,
     repo: str,
     current_user: Dict[str, Any] = Depends(get_user_from_token),
@@ -165,47 +169,47 @@ async def setup_webhook(
     logger.info(f"Setting up webhook for {repo_full_name} to {settings.WEBHOOK_URL}")
     
     try:
-        async with httpx.AsyncClient() as client:
-            existing_hook = await check_existing_webhook(client, owner,repo,token)
-            if existing_hook:
-                hook_id = str(existing_hook['id'])
-                hook_url = existing_hook['config'].get('url', '')
-                events = existing_hook.get('events', [])
-                
-                add_or_update_registered_webhook(
-                    db_session,
-                    repository=repo_full_name,
-                    hook_id=hook_id,
-                    hook_url=hook_url,
-                    events=events
-                )
-                
-                logger.info(f"Webhook already exists for {repo_full_name}: {hook_id}")
-                return {
-                    "status": "success", 
-                    "message": "Webhook already exists", 
-                    "hook_id": hook_id
-                }
+        client = request.app.state.http
+        existing_hook = await check_existing_webhook(client, owner,repo,token)
+        if existing_hook:
+            hook_id = str(existing_hook['id'])
+            hook_url = existing_hook['config'].get('url', '')
+            events = existing_hook.get('events', [])
             
-            hook_data = await create_webhook(client, owner,repo,token)
-            if hook_data:
-                hook_id = str(hook_data['id'])
-                events = hook_data.get('events', [])
-                
-                add_or_update_registered_webhook(
-                    db_session,
-                    repository=repo_full_name,
-                    hook_id=hook_id,
-                    hook_url=settings.WEBHOOK_URL,
-                    events=events
-                )
-                
-                logger.info(f"Webhook created successfully: {hook_id}")
-                
-                return {"status": "success", "message": "Webhook created successfully", "hook_id": hook_id}
-            else:
-                return {"status": "error", "message": "Failed to create webhook"}
-    
+            add_or_update_registered_webhook(
+                db_session,
+                repository=repo_full_name,
+                hook_id=hook_id,
+                hook_url=hook_url,
+                events=events
+            )
+            
+            logger.info(f"Webhook already exists for {repo_full_name}: {hook_id}")
+            return {
+                "status": "success", 
+                "message": "Webhook already exists", 
+                "hook_id": hook_id
+            }
+        
+        hook_data = await create_webhook(client, owner,repo,token)
+        if hook_data:
+            hook_id = str(hook_data['id'])
+            events = hook_data.get('events', [])
+            
+            add_or_update_registered_webhook(
+                db_session,
+                repository=repo_full_name,
+                hook_id=hook_id,
+                hook_url=settings.WEBHOOK_URL,
+                events=events
+            )
+            
+            logger.info(f"Webhook created successfully: {hook_id}")
+            
+            return {"status": "success", "message": "Webhook created successfully", "hook_id": hook_id}
+        else:
+            return {"status": "error", "message": "Failed to create webhook"}
+
     except Exception as e:
         logger.error(f"Error setting up webhook: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -248,51 +252,32 @@ async def setup_webhook(
     }
     ```
     
-    Response example for a successful webhook processing:
+    The event is stored and the endpoint answers 202 right away. Push events are queued
+    and any auto-deployments are started in the background, so the response does not
+    say whether a deployment was triggered:
     ```json
     {
-      "status": "success",
-      "message": "Webhook event processed",
-      "action": "Deployment triggered for docker-app/main",
-      "deployment_id": "7a8b9c0d-1e2f-3g4h-5i6j-7k8l9m0n1o2p"
+      "status": "accepted",
+      "event_id": "2023-03-28T15:00:01.123456-push",
+      "deployment_queued": true
     }
     ```
     
-    Or when no deployment is triggered:
-    ```json
-    {
-      "status": "success",
-      "message": "Webhook event processed",
-      "action": "No deployment triggered: Auto-deploy not enabled for this branch"
-    }
-    ```
+    If the deployment queue is full the endpoint answers 503 and GitHub can redeliver the event.
     
     Note: This endpoint must be added as a webhook in your GitHub repository settings with the content type set to 'application/json'.
     """,
     response_model=Dict[str, Any],
+    status_code=status.HTTP_202_ACCEPTED,
     responses={
-        200: {
-            "description": "Webhook processed successfully",
+        202: {
+            "description": "Webhook accepted; push events are queued for deployment",
             "content": {
                 "application/json": {
-                    "examples": {
-                        "deployment_triggered": {
-                            "summary": "Deployment triggered",
-                            "value": {
-                                "status": "success",
-                                "message": "Webhook event processed",
-                                "action": "Deployment triggered for username/docker-app:main",
-                                "deployment_id": "7a8b9c0d-1e2f-3g4h-5i6j-7k8l9m0n1o2p"
-                            }
-                        },
-                        "no_deployment": {
-                            "summary": "No deployment triggered",
-                            "value": {
-                                "status": "success",
-                                "message": "Webhook event processed",
-                                "action": "No deployment triggered: Auto-deploy not enabled for this branch"
-                            }
-                        }
+                    "example": {
+                        "status": "accepted",
+                        "event_id": "2023-03-28T15:00:01.123456-push",
+                        "deployment_queued": True
                     }
                 }
             }
@@ -318,6 +303,14 @@ async def setup_webhook(
                     }
                 }
             }
+        },
+        503: {
+            "description": "Deployment queue is full",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Webhook queue is full, retry later"}
+                }
+            }
         }
     }
 )
@@ -332,7 +325,7 @@ async def webhook(
     1. Validates the webhook event type
     2. Processes the payload
     3. Stores the event in the database
-    4. Triggers automatic deployments if configured
+    4. Queues push events for the dispatcher, which triggers automatic deployments if configured
     
     Supported event types:
     - push
@@ -353,39 +346,42 @@ async def webhook(
         if not event_type:
             raise HTTPException(status_code=400, detail="X-GitHub-Event header missing")
             
-        payload = await request.json()
-        repository = payload.get("repository", {})
-        repo_name = repository.get("full_name", "unknown")
+        try:
+            payload = orjson.loads(await request.body())
+        except orjson.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        repo_name = (payload.get("repository") or {}).get("full_name", "unknown")
         
         logger.info(f"Received {event_type} event from {repo_name}")
         
         event_id = f"{datetime.now().isoformat()}-{event_type}"
         timestamp = datetime.now().isoformat()
         
-        # Store webhook event
-        add_webhook_event(db_session, event_id, event_type, payload)
-        
-        # Check if this event should trigger a deployment
-        deployment_id = None
-        deployment_triggered = False
+        # Store webhook event against the registered webhook for this repository (if any),
+        # since webhook_id is a foreign key to registered_webhooks
+        registered_webhooks = get_webhook_by_repository(db_session, repo_name)
+        webhook_id = registered_webhooks[0].id if registered_webhooks else None
+        add_webhook_event(db_session, webhook_id, event_type, payload)
         
+        # Deployments for push events are looked up and started by the dispatcher, off the request path
+        deployment_queued = False
         if event_type == "push":
-            # Only process main branch push events for deployment
-            ref = payload.get("ref", "")
-            if ref:
-                # Process webhook for deployment
-                deployment_id = process_webhook_event(db_session, event_type, payload)
-                if deployment_id:
-                    deployment_triggered = True
-                    logger.info(f"Triggered deployment {deployment_id} for {repo_name}")
+            try:
+                push_event = PushEvent.model_validate(payload)
+            except ValidationError:
+                raise HTTPException(status_code=400, detail="Invalid push payload: missing repository or ref")
+            if not dispatcher.enqueue(push_event):
+                raise HTTPException(status_code=503, detail="Webhook queue is full, retry later")
+            deployment_queued = True
             
         return {
-            "status": "success", 
+            "status": "accepted",
             "event_id": event_id,
-            "deployment_triggered": deployment_triggered,
-            "deployment_id": deployment_id
+            "deployment_queued": deployment_queued
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Webhook processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import AliasPath, BaseModel, ConfigDict, Field
 from typing import Dict, Any, Optional, List
 
 class WebhookPayload(BaseModel):
@@ -40,3 +40,11 @@ class WebhookInput(BaseModel):
     payload: Dict[str, Any] = Field(..., description="Webhook payload")
 
 
+class PushEvent(BaseModel):
+    """The fields of a GitHub push webhook that auto-deployment needs; the rest is ignored"""
+    model_config = ConfigDict(extra="ignore")
+
+    repo_full_name: str = Field(..., validation_alias=AliasPath("repository", "full_name"), description="Repository full name")
+    ref: str = Field(..., description="Git reference that was pushed")
+    # GitHub sends a null head_commit when a branch is deleted
+    head_commit_id: Optional[str] = Field(None, validation_alias=AliasPath("head_commit", "id"), description="Pushed commit SHA")
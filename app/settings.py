@@ -18,6 +18,20 @@ class Settings(BaseSettings):
     # Security
     WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
     PASSWORD: str | None = os.getenv("PASSWORD")
+    # argon2id parameters for new password hashes (memory in KiB); lower them for tests.
+    # Stored hashes with other parameters are rehashed on the next successful login
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", "3"))
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", "65536"))
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", "4"))
+    # Test runs only: reuse password hashes (and so their salts) across calls. Never enable in production
+    TESTING: bool = os.getenv("TESTING", "").lower() in ("1", "true", "yes")
+    
+    # Deployments run at most this many at a time; further ones queue
+    DEPLOY_CONCURRENCY: int = int(os.getenv("DEPLOY_CONCURRENCY", "4"))
+    # Append-only deployment log files, one per deployment
+    DEPLOY_LOG_DIR: str = os.getenv("DEPLOY_LOG_DIR", "deploy_logs")
+    # Bare partial clones kept between deploys for the git fetch path
+    REPO_CACHE_DIR: str = os.getenv("REPO_CACHE_DIR", os.path.expanduser("~/.cache/quark/repos"))
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./app.db")
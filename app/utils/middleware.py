@@ -6,9 +6,10 @@ from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.concurrency import iterate_in_threadpool
 from sqlalchemy.orm import Session
-from app.database.database import RequestLogDB, SessionLocal
+from app.database.database import SessionLocal
+from app.database.request_log_crud import create_request_log
 from app.routes.auth import verify_token
-from app.database.user_crud import get_user_by_id
+from app.database.user_crud import get_user_row
 
 logger = logging.getLogger(__name__)
 
@@ -66,31 +67,22 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 except:
                     response_body = None
 
-            # Create log entry
+            # Queue log entry (written and broadcast by the background log writer)
             try:
-                db = SessionLocal()
-                log_entry = RequestLogDB(
+                create_request_log(
                     method=method,
                     path=path,
                     status_code=status_code,
                     response_time=process_time,
-                    request_body=json.dumps(request_data) if request_data else None,
-                    response_body=json.dumps(response_body) if response_body else None,
-                    headers=json.dumps(dict(request.headers)),
+                    request_body=request_data,
+                    response_body=response_body,
+                    headers=dict(request.headers),
                     client_ip=client_ip,
-                    user_agent=user_agent
+                    user_agent=user_agent,
+                    user_id=request.scope.get("user_id", user_id)
                 )
-                db.add(log_entry)
-                db.commit()
-                db.refresh(log_entry)
-                
-                # Broadcast the log entry
-                log_entry.broadcast_log()
-                
             except Exception as e:
                 logger.error(f"Error logging request: {str(e)}")
-            finally:
-                db.close()
             
             # Add processing time header
             response.headers["X-Process-Time"] = str(process_time)
@@ -108,31 +100,22 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 "detail": str(e)
             }
 
-            # Log error request to database
+            # Queue error request log entry
             try:
-                db = SessionLocal()
-                log_entry = RequestLogDB(
+                create_request_log(
                     method=method,
                     path=path,
                     status_code=500,
                     response_time=process_time,
-                    request_body=json.dumps(request_data) if request_data else None,
-                    response_body=json.dumps(error_response),
-                    headers=json.dumps(dict(request.headers)),
+                    request_body=request_data,
+                    response_body=error_response,
+                    headers=dict(request.headers),
                     client_ip=client_ip,
-                    user_agent=user_agent
+                    user_agent=user_agent,
+                    user_id=request.scope.get("user_id", user_id)
                 )
-                db.add(log_entry)
-                db.commit()
-                db.refresh(log_entry)
-                
-                # Broadcast the log entry
-                log_entry.broadcast_log()
-                
             except Exception as log_err:
                 logger.error(f"Error logging error request: {str(log_err)}")
-            finally:
-                db.close()
             
             # Re-raise original exception
             raise 
@@ -162,20 +145,20 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 user_id = jwt_payload["sub"]
                 db = SessionLocal()
                 try:
-                    user = get_user_by_id(db, user_id)
+                    user = get_user_row(db, user_id)
                     if user:
                         # Add user info to request scope for logging
-                        request.scope["user_id"] = user.id
-                        request.scope["username"] = user.username
+                        request.scope["user_id"] = user["id"]
+                        request.scope["username"] = user["username"]
                         
-                        if user.github_access_token:
+                        if user["github_access_token"]:
                             # If the user has a GitHub token, modify the request to include it
                             # for endpoints that need GitHub API access
-                            request.scope["github_token"] = user.github_access_token
+                            request.scope["github_token"] = user["github_access_token"]
                             
                             # Also create a new headers dict with the GitHub token for internal use
                             headers = dict(request.headers)
-                            headers["X-GitHub-Token"] = user.github_access_token
+                            headers["X-GitHub-Token"] = user["github_access_token"]
                             request.scope["headers"] = [(k.encode(), v.encode()) for k, v in headers.items()]
                 finally:
                     db.close()
@@ -207,9 +190,6 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             return
         
         try:
-            # Create a new database session
-            db = SessionLocal()
-            
             # Prepare headers for logging (excluding sensitive ones)
             headers_dict = dict(request.headers.items())
             sanitized_headers = headers_dict.copy()
@@ -223,30 +203,21 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             # Prepare request body for logging (sanitize if needed)
             sanitized_body = self._sanitize_body(request_body)
             
-            # Create log entry
-            log_entry = RequestLogDB(
+            # Queue log entry for the background writer, which also broadcasts it
+            create_request_log(
                 method=request.method,
                 path=request.url.path,
                 status_code=response.status_code,
                 response_time=process_time,
-                request_body=sanitized_body,
-                response_body="{}", # We don't log response bodies by default
-                headers=json.dumps(sanitized_headers),
+                request_body=json.loads(sanitized_body),
+                response_body={}, # We don't log response bodies by default
+                headers=sanitized_headers,
                 client_ip=headers_dict.get("X-Forwarded-For") or request.client.host,
                 user_agent=headers_dict.get("User-Agent")
             )
             
-            # Add log to database
-            db.add(log_entry)
-            db.commit()
-            
-            # Broadcast log via WebSockets if configured
-            log_entry.broadcast_log()
-            
         except Exception as e:
             logger.error(f"Error logging request: {str(e)}")
-        finally:
-            db.close()
     
     def _sanitize_body(self, body: str) -> str:
         """Sanitize request body to remove sensitive information"""
@@ -321,19 +292,19 @@ async def authenticate_request(request: Request) -> Optional[Dict[str, Any]]:
         db = SessionLocal()
         try:
             user_id = jwt_payload["sub"]
-            user = get_user_by_id(db, user_id)
+            user = get_user_row(db, user_id)
             if not user:
                 logger.warning(f"User not found for ID {user_id}")
                 return None
                 
             # For endpoints requiring GitHub, use the stored GitHub token
-            logger.info(f"Authenticated user: {user.username} via JWT token")
+            logger.info("Authenticated user: %s via JWT token", user["username"])
             return {
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "github_connected": bool(user.github_id),
-                "github_token": user.github_access_token,
+                "id": user["id"],
+                "username": user["username"],
+                "email": user["email"],
+                "github_connected": bool(user["github_id"]),
+                "github_token": user["github_access_token"],
                 "auth_type": jwt_payload.get("auth_type", "password")
             }
         finally:
@@ -345,10 +316,10 @@ async def authenticate_request(request: Request) -> Optional[Dict[str, Any]]:
     
     try:
         # Try as GitHub token directly
-        github_user = await get_github_user(token)
+        github_user = await get_github_user(token, request.app.state.http)
         if github_user:
             # It's a direct GitHub token
-            logger.info(f"Authenticated user: {github_user.get('username')} via GitHub token")
+            logger.info("Authenticated user: %s via GitHub token", github_user.get('username'))
             return github_user
     except Exception as e:
         logger.error(f"Error authenticating with GitHub token: {str(e)}")
@@ -1,5 +1,6 @@
 from app.settings import settings
 import logging
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ async def create_webhook(client, owner, repo, token):
     )
     
     if response.status_code == 201:
-        return response.json()
+        return orjson.loads(response.content)
     else:
         error_detail = f"Failed to create webhook: {response.text}"
         logger.error(error_detail)
@@ -40,7 +41,7 @@ async def check_existing_webhook(client, owner, repo, token):
         logger.error(f"Error checking existing hooks: {hooks_response.text}")
         return None
     
-    hooks = hooks_response.json()
+    hooks = orjson.loads(hooks_response.content)
     
     # Check if a webhook for our app already exists
     for hook in hooks:
@@ -1,7 +1,7 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Dict, Iterable, List
 import asyncio
-import json
+import orjson
 
 class LogConnectionManager:
     def __init__(self):
@@ -14,25 +14,36 @@ class LogConnectionManager:
         self.active_connections[log_id].append(websocket)
 
     def disconnect(self, websocket: WebSocket, log_id: str):
-        if log_id in self.active_connections:
-            self.active_connections[log_id].remove(websocket)
-            if not self.active_connections[log_id]:
+        connections = self.active_connections.get(log_id)
+        if connections and websocket in connections:
+            connections.remove(websocket)
+            if not connections:
                 del self.active_connections[log_id]
 
-    async def broadcast_log(self, log_id: str, log_entry: dict):
-        if log_id in self.active_connections:
-            dead_connections = []
-            for connection in self.active_connections[log_id]:
-                try:
-                    await connection.send_json(log_entry)
-                except:
-                    dead_connections.append(connection)
-            
-            # Clean up dead connections
-            for dead_connection in dead_connections:
-                self.active_connections[log_id].remove(dead_connection)
-            
-            if not self.active_connections[log_id]:
-                del self.active_connections[log_id]
+    def has_subscribers(self, log_ids: Iterable[str]) -> bool:
+        return any(log_id in self.active_connections for log_id in log_ids)
+
+    async def broadcast_log(self, log_ids: Iterable[str], log_entry: dict):
+        # Collect each subscriber once across all channels, remembering its channels for cleanup
+        subscribers: Dict[WebSocket, List[str]] = {}
+        for log_id in log_ids:
+            for connection in self.active_connections.get(log_id, []):
+                subscribers.setdefault(connection, []).append(log_id)
+        if not subscribers:
+            return
+
+        # Encode once and send the same text frame to every subscriber
+        message = orjson.dumps(log_entry).decode()
+        dead_connections = []
+        for connection in subscribers:
+            try:
+                await connection.send_text(message)
+            except:
+                dead_connections.append(connection)
+
+        # Clean up dead connections
+        for dead_connection in dead_connections:
+            for log_id in subscribers[dead_connection]:
+                self.disconnect(dead_connection, log_id)
 
-log_manager = LogConnectionManager() 
\ No newline at end of file
+log_manager = LogConnectionManager()
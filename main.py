@@ -1,8 +1,10 @@
 import logging
 from fastapi import FastAPI, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer
 from fastapi.openapi.utils import get_openapi
+import httpx
 import uvicorn
 
 
@@ -12,7 +14,11 @@ from app.routes.webhooks import router as webhooks_router
 from app.routes.user import router as user_router
 from app.routes.logs import router as logs_router
 from app.routes.deployments import router as deployments_router
-from app.database.database import init_db
+from app.database.database import init_db, async_engine
+from app.database import log_writer, maintenance, payload_writer
+from app.database.user_crud import shutdown_hash_pool
+from app.deployment import dispatcher
+from app.deployment.engine import close_http_client, shutdown_trash_pool
 from app.utils.middleware import RequestLoggingMiddleware, authenticate_request
 from app.websockets.logs import log_manager
 
@@ -114,7 +120,9 @@ app = FastAPI(
             "name": "deploy",
             "description": "Deployment configuration and execution (requires GitHub integration)"
         }
-    ]
+    ],
+    # Serialize JSON responses with orjson rather than the standard library
+    default_response_class=ORJSONResponse
 )
 
 # Add security schemes to OpenAPI
@@ -214,6 +222,33 @@ app.add_middleware(
 # Initialize db
 init_db()
 
+@app.on_event("startup")
+async def start_background_writers():
+    """Start the batched request log and webhook payload writers, periodic database maintenance, the webhook dispatcher and the shared HTTP client"""
+    log_writer.start()
+    payload_writer.start()
+    maintenance.start()
+    dispatcher.start()
+    # One pooled client for all outbound GitHub calls from the routes and auth
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200)
+    )
+
+@app.on_event("shutdown")
+async def stop_background_writers():
+    """Stop the webhook dispatcher, flush and stop the batched writers, database maintenance and hashing pool, and close shared connections"""
+    await dispatcher.stop()
+    await maintenance.stop()
+    await payload_writer.stop()
+    await log_writer.stop()
+    shutdown_hash_pool()
+    close_http_client()
+    shutdown_trash_pool()
+    await app.state.http.aclose()
+    await async_engine.dispose()
+
 # Include routers with tags
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(user_router, prefix="/user", tags=["user"])
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import orjson
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import webhook_crud
+from app.database.database import Base, UserDB, _json_serializer
+
+
+@pytest.fixture
+def db():
+    """A session on a fresh in-memory database with the full schema"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads
+    )
+    Base.metadata.create_all(engine)
+    # The event row cache assumes a single database for the life of the process
+    webhook_crud._known_events.clear()
+    session = sessionmaker(autoflush=False, expire_on_commit=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def user(db):
+    user = UserDB(username="alice", email="alice@example.com")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def count_queries(db):
+    """Context manager collecting the SQL of every statement the test database runs inside the block
+
+    Pins down N+1 regressions; a lazy load per row shows up as one more query per row:
+
+        with count_queries() as queries:
+            get_registered_webhooks(db)
+        assert len(queries) <= 2, queries
+    """
+    engine = db.get_bind()
+
+    @contextmanager
+    def counter() -> Iterator[List[str]]:
+        queries: List[str] = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            queries.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            yield queries
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+
+    return counter
@@ -0,0 +1,37 @@
+import pytest
+
+from app.database.database import RegisteredWebhookDB
+from app.database.webhook_crud import (
+    _get_or_create_events,
+    get_registered_webhooks,
+    get_registered_webhooks_by_repository,
+)
+
+
+def add_webhooks(db, user, count):
+    for i in range(count):
+        webhook = RegisteredWebhookDB(repository="o/r", hook_id=str(i), hook_url="https://example.com", user_id=user.id)
+        webhook.events = _get_or_create_events(db, ["push", "pull_request", "release"])
+        db.add(webhook)
+        db.commit()
+    # Start from an empty identity map so nothing is served from memory
+    db.expunge_all()
+
+
+@pytest.mark.parametrize("count", [1, 10])
+@pytest.mark.parametrize("listing", [
+    lambda db: get_registered_webhooks(db),
+    lambda db: get_registered_webhooks_by_repository(db, "o/r"),
+])
+def test_webhook_listing_loads_events_without_n_plus_1(db, user, count_queries, count, listing):
+    add_webhooks(db, user, count)
+
+    with count_queries() as queries:
+        webhooks = listing(db)
+        # Detached instances raise instead of lazy loading, so this only passes if the listing loaded events
+        db.expunge_all()
+        event_names = [sorted(event.name for event in webhook.events) for webhook in webhooks]
+
+    assert event_names == [["pull_request", "push", "release"]] * count
+    # One SELECT for the webhooks and one IN query for all of their events, however many rows
+    assert len(queries) <= 2, queries
@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, List
+
+import pytest
+from sqlalchemy import insert, text
+
+from app.database.database import RegisteredWebhookDB, WebhookPayloadDB, get_utc_now
+from app.database.webhook_crud import (
+    get_registered_webhooks,
+    get_registered_webhooks_by_repository,
+    get_webhook_event_summaries,
+    get_webhook_events,
+    get_webhook_events_by_repository,
+)
+
+
+def walk_pages(fetch_page: Callable[[Dict[str, Any]], List[Any]],
+               next_cursor: Callable[[Any], Dict[str, Any]]) -> List[Any]:
+    """Follow a listing's cursor until an empty page, failing as soon as a row repeats
+
+    Failing on the first repeat also stops a cursor that never advances from looping forever.
+    """
+    rows, seen, cursor = [], set(), {}
+    while True:
+        page = fetch_page(cursor)
+        if not page:
+            return rows
+        for row in page:
+            assert row.id not in seen, f"row {row.id!r} returned twice after cursor {cursor!r}"
+            seen.add(row.id)
+        rows.extend(page)
+        cursor = next_cursor(page[-1])
+
+
+def by_id(row):
+    return {"before_id": row.id}
+
+
+def by_last_synced(webhook):
+    return {"before": webhook.last_synced, "before_id": webhook.id}
+
+
+@pytest.fixture
+def webhooks(db, user):
+    hooks = [
+        RegisteredWebhookDB(repository="o/a" if i % 2 else "o/b", hook_id=str(i), hook_url="https://example.com", user_id=user.id)
+        for i in range(7)
+    ]
+    db.add_all(hooks)
+    db.commit()
+    return hooks
+
+
+@pytest.fixture
+def payloads(db, webhooks):
+    # Each batch shares one received_at, like the batched payload writer's inserts
+    for batch in range(3):
+        received_at = get_utc_now()
+        db.execute(insert(WebhookPayloadDB), [
+            {"webhook_id": webhooks[0].id, "repository": {"full_name": "o/a" if i % 2 else "o/b"},
+             "pusher": {}, "ref": f"refs/heads/{batch}-{i}", "received_at": received_at}
+            for i in range(4)
+        ])
+    db.commit()
+
+
+@pytest.mark.parametrize("listing, expected", [
+    (lambda db, c: get_webhook_events(db, limit=2, **c), 12),
+    (lambda db, c: get_webhook_event_summaries(db, limit=2, **c), 12),
+    (lambda db, c: get_webhook_events_by_repository(db, "o/a", limit=2, **c), 6),
+])
+def test_payload_pages_cover_every_row_once(db, payloads, listing, expected):
+    rows = walk_pages(lambda cursor: listing(db, cursor), by_id)
+    assert len(rows) == expected
+    assert [row.id for row in rows] == sorted((row.id for row in rows), reverse=True)
+
+
+@pytest.mark.parametrize("listing, expected", [
+    (lambda db, c: get_registered_webhooks(db, limit=2, **c), 7),
+    (lambda db, c: get_registered_webhooks_by_repository(db, "o/a", limit=2, **c), 3),
+])
+def test_webhook_pages_cover_every_row_once(db, webhooks, listing, expected):
+    assert len(walk_pages(lambda cursor: listing(db, cursor), by_last_synced)) == expected
+
+
+def test_webhook_pages_with_mixed_timestamp_formats(db, webhooks):
+    # Rows written by the old strftime server default had 3 fractional digits, while
+    # bound datetimes have 6; the same instant must sort as a tie broken by id
+    for i, webhook in enumerate(webhooks):
+        stamp = "2026-01-01 00:00:00.123" + ("" if i % 2 else "000")
+        db.execute(text("UPDATE registered_webhooks SET last_synced = :stamp WHERE id = :id"),
+                   {"stamp": stamp, "id": webhook.id})
+    db.commit()
+    db.expire_all()
+
+    rows = walk_pages(lambda cursor: get_registered_webhooks(db, limit=2, **cursor), by_last_synced)
+    assert sorted(row.id for row in rows) == sorted(webhook.id for webhook in webhooks)
+
+
+def test_webhook_cursor_needs_both_values(db, webhooks):
+    with pytest.raises(ValueError):
+        get_registered_webhooks(db, before_id=webhooks[0].id)
+    with pytest.raises(ValueError):
+        get_registered_webhooks(db, before=get_utc_now())